@@ -0,0 +1,256 @@
+from flask import Flask
+from flask_login import LoginManager
+from flask_wtf.csrf import CSRFProtect
+from werkzeug.security import generate_password_hash
+from sqlalchemy import insert, select, text, update
+from dotenv import load_dotenv
+from models import db, User, Category
+from backends import backend_for_uri, ensure_columns, ensure_indexes, load_backend
+import routing
+from audit import audit_queue
+import stats
+import catalog
+import fragments
+import compression
+import assets
+import limits
+import os
+import os.path as op
+import time
+
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+csrf = CSRFProtect()
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return db.session.get(User, int(user_id))
+
+
+def load_config(app, default_uri):
+    """从 .env / 环境变量读取配置"""
+    load_dotenv(os.path.join(basedir, '.env'))
+
+    app.config['APP_TITLE'] = os.getenv('APP_TITLE', '狼的小卖部')
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'fallback_secret_key')
+    app.config['UPLOAD_FOLDER'] = op.abspath(op.expanduser(os.getenv('UPLOAD_FOLDER', 'static/uploads')))
+    app.config['BACKGROUND_IMAGE_URL'] = os.getenv('BACKGROUND_IMAGE_URL', '')
+    app.config['BACKGROUND_OPACITY'] = float(os.getenv('BACKGROUND_OPACITY', 0.1))
+    app.config['BACKGROUND_SIZE'] = os.getenv('BACKGROUND_SIZE', 'cover')
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 2097152))
+    app.config['PER_PAGE'] = int(os.getenv('PER_PAGE', 10))
+    app.config['SMTP_SERVER'] = os.getenv('SMTP_SERVER', 'smtp.qq.com')
+    app.config['SMTP_PORT'] = int(os.getenv('SMTP_PORT', 587))
+    app.config['SMTP_USERNAME'] = os.getenv('SMTP_USERNAME', '')
+    app.config['SMTP_PASSWORD'] = os.getenv('SMTP_PASSWORD', '')
+    app.config['SMTP_USE_TLS'] = os.getenv('SMTP_USE_TLS', 'True').lower() == 'true'
+    app.config['FROM_EMAIL'] = os.getenv('FROM_EMAIL', '')
+    app.config['SECURITY_PASSWORD_SALT'] = os.getenv('SECURITY_PASSWORD_SALT', 'another-secret-salt')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', default_uri)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ECHO'] = False
+    # PostgreSQL 按月分区 sale/log（仅使用PostgreSQL时生效）
+    app.config['PG_PARTITIONING'] = os.getenv('PG_PARTITIONING', 'False').lower() == 'true'
+    app.config['PG_PARTITION_MONTHS_AHEAD'] = int(os.getenv('PG_PARTITION_MONTHS_AHEAD', 3))
+    # psycopg 3 自动预备语句的执行次数阈值；经 PgBouncer 事务池（1.21 以下）连接时设为 none 关闭
+    threshold = os.getenv('PG_PREPARE_THRESHOLD', '5')
+    app.config['PG_PREPARE_THRESHOLD'] = None if threshold.lower() == 'none' else int(threshold)
+    app.config['PG_PARTITION_BATCH'] = int(os.getenv('PG_PARTITION_BATCH', 5000))
+    # 导入商品达到此行数时用 COPY 临时表合并
+    app.config['PG_COPY_IMPORT_MIN_ROWS'] = int(os.getenv('PG_COPY_IMPORT_MIN_ROWS', 1000))
+    app.config['AUDIT_ASYNC'] = os.getenv('AUDIT_ASYNC', 'True').lower() == 'true'
+    app.config['AUDIT_BATCH_SIZE'] = int(os.getenv('AUDIT_BATCH_SIZE', 100))
+    app.config['AUDIT_FLUSH_INTERVAL'] = float(os.getenv('AUDIT_FLUSH_INTERVAL', 2.0))
+    app.config['IDEMPOTENCY_TTL'] = int(os.getenv('IDEMPOTENCY_TTL', 86400))
+    app.config['BARCODE_CACHE_SIZE'] = int(os.getenv('BARCODE_CACHE_SIZE', 100000))
+    app.config['CATEGORY_CACHE_TTL'] = float(os.getenv('CATEGORY_CACHE_TTL', 5))
+    app.config['FRAGMENT_CACHE_BACKEND'] = os.getenv('FRAGMENT_CACHE_BACKEND', 'memory')
+    app.config['FRAGMENT_CACHE_SIZE'] = int(os.getenv('FRAGMENT_CACHE_SIZE', 5000))
+    app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'True').lower() == 'true'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_BR_LEVEL'] = int(os.getenv('COMPRESS_BR_LEVEL', 4))
+    # 启动时要求 static/vendor/ 中已有 Bootstrap、ECharts（flask assets-vendor）
+    app.config['ASSETS_REQUIRE_VENDOR'] = os.getenv('ASSETS_REQUIRE_VENDOR', 'True').lower() == 'true'
+    app.config['RAISE_ON_LAZY_LOAD'] = os.getenv('RAISE_ON_LAZY_LOAD', 'False').lower() == 'true'
+    # 可选只读副本，报表类页面从副本读取
+    app.config['SQLALCHEMY_REPLICA_URI'] = os.getenv('SQLALCHEMY_REPLICA_URI', '')
+    app.config['REPLICA_PIN_SECONDS'] = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+    # 连接池参数，未设置时使用各后端的默认值（见 backends/pool.py）
+    for key in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_TIMEOUT', 'DB_POOL_RECYCLE'):
+        app.config[key] = int(os.environ[key]) if os.getenv(key) else None
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING') or None
+    app.config['DB_POOL_PING_IDLE'] = float(os.getenv('DB_POOL_PING_IDLE', 30))
+    app.config['DB_POOL_USE_LIFO'] = os.getenv('DB_POOL_USE_LIFO', 'False').lower() == 'true'
+    app.config['DB_POOL_SLOW_CHECKOUT_MS'] = float(os.getenv('DB_POOL_SLOW_CHECKOUT_MS', 100))
+    # 语句超时（毫秒，0 为不限）与重型请求限流，见 limits.py
+    app.config['REPORT_STATEMENT_TIMEOUT_MS'] = int(os.getenv('REPORT_STATEMENT_TIMEOUT_MS', 10000))
+    app.config['HEAVY_STATEMENT_TIMEOUT_MS'] = int(os.getenv('HEAVY_STATEMENT_TIMEOUT_MS', 30000))
+    app.config['HEAVY_MAX_CONCURRENT'] = int(os.getenv('HEAVY_MAX_CONCURRENT', 2))
+    app.config['HEAVY_RETRY_AFTER'] = int(os.getenv('HEAVY_RETRY_AFTER', 10))
+    # 启动初始化：连接数据库失败时的重试次数与指数退避间隔（秒）
+    app.config['BOOTSTRAP_RETRIES'] = int(os.getenv('BOOTSTRAP_RETRIES', 6))
+    app.config['BOOTSTRAP_BACKOFF'] = float(os.getenv('BOOTSTRAP_BACKOFF', 0.5))
+    app.config['BOOTSTRAP_BACKOFF_MAX'] = float(os.getenv('BOOTSTRAP_BACKOFF_MAX', 8))
+    app.config['INIT_ON_START'] = os.getenv('INIT_ON_START', 'True').lower() == 'true'
+    app.config['REPLICA_RETRY_SECONDS'] = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+    app.config['DASHBOARD_ANNOUNCEMENT'] = os.getenv('DASHBOARD_ANNOUNCEMENT', '')
+    app.config['ANNOUNCEMENT_ENABLED'] = os.getenv('ANNOUNCEMENT_ENABLED', 'False').lower() == 'true'
+    app.config['ANALYZE_SCRIPT'] = os.getenv('ANALYZE_SCRIPT', '')
+    app.config['ANALYZE_ENABLE'] = os.getenv('ANALYZE_ENABLE', 'False').lower() == 'true'
+    app.config['TEMPLATES_AUTO_RELOAD'] = True
+    # SQLite 连接参数（仅使用SQLite时生效）
+    app.config['SQLITE_PRAGMAS_ENABLED'] = os.getenv('SQLITE_PRAGMAS_ENABLED', 'True').lower() == 'true'
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.getenv('SQLITE_BUSY_TIMEOUT', 30000))
+    app.config['SQLITE_CACHE_SIZE'] = int(os.getenv('SQLITE_CACHE_SIZE', -64000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))
+    app.config['SQLITE_TEMP_STORE'] = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+    # 开启后与MySQL/PostgreSQL一样校验外键（删除仍有销售记录的商品会失败）
+    app.config['SQLITE_FOREIGN_KEYS'] = os.getenv('SQLITE_FOREIGN_KEYS', 'False').lower() == 'true'
+    app.config['SQLITE_OPTIMIZE_INTERVAL'] = int(os.getenv('SQLITE_OPTIMIZE_INTERVAL', 3600))
+    app.config['SQLITE_BACKUP_DIR'] = op.abspath(op.expanduser(os.getenv('SQLITE_BACKUP_DIR', 'backups')))
+    app.config['SQLITE_BACKUP_PAGES'] = int(os.getenv('SQLITE_BACKUP_PAGES', 256))
+    app.config['SQLITE_BACKUP_SLEEP'] = float(os.getenv('SQLITE_BACKUP_SLEEP', 0.05))
+    app.config['SQLITE_BACKUP_COMPRESS'] = os.getenv('SQLITE_BACKUP_COMPRESS', 'True').lower() == 'true'
+    app.config['SQLITE_BACKUP_KEEP'] = int(os.getenv('SQLITE_BACKUP_KEEP', 7))
+
+
+def create_app(default_backend='sqlite', config=None):
+    """
+    应用工厂。
+
+    数据库类型由 SQLALCHEMY_DATABASE_URI 决定；default_backend 仅在未配置URI时
+    提供默认连接串（sqlite / mysql / postgresql）。
+    """
+    app = Flask(__name__)
+    load_config(app, load_backend(default_backend).DEFAULT_URI)
+    if config:
+        app.config.update(config)
+
+    backend = backend_for_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.extensions['sales_backend'] = backend
+    # 显式传入的引擎参数优先于后端默认值
+    engine_options = backend.engine_options(app.config)
+    engine_options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    csrf.init_app(app)
+    routing.init_app(app)
+    db.init_app(app)
+    login_manager.init_app(app)
+    backend.init_app(app)
+    audit_queue.init_app(app)
+    stats.init_app(app)
+    fragments.init_app(app)
+    compression.init_app(app)
+    assets.init_app(app)
+    limits.init_app(app)
+
+    from views import bp
+    app.register_blueprint(bp)
+
+    @app.cli.command('init')
+    def init_command():
+        """建库、建表/补列/建索引并初始化管理员与默认分类（可重复执行）"""
+        bootstrap(app)
+
+    if not os.path.exists(app.config['UPLOAD_FOLDER']):
+        os.makedirs(app.config['UPLOAD_FOLDER'])
+
+    return app
+
+
+def wait_for_database(app, backend):
+    """
+    等待数据库可连接（不存在时自动建库）。失败时按指数退避重试，
+    间隔从 BOOTSTRAP_BACKOFF 秒起每次翻倍，最长 BOOTSTRAP_BACKOFF_MAX 秒。
+    """
+    delay = app.config['BOOTSTRAP_BACKOFF']
+    retries = app.config['BOOTSTRAP_RETRIES']
+    for attempt in range(1, retries + 1):
+        if backend.create_database_if_not_exists(db.engine):
+            return True
+        if attempt < retries:
+            print(f"数据库尚未就绪，{delay:g} 秒后第 {attempt} 次重试...")
+            time.sleep(delay)
+            delay = min(delay * 2, app.config['BOOTSTRAP_BACKOFF_MAX'])
+    return False
+
+
+def seed(conn):
+    """确保至少有一个活跃的管理员账户和一个分类"""
+    users = User.__table__
+    categories = Category.__table__
+    active_admin = conn.execute(
+        select(users.c.id).where(users.c.is_admin == True, users.c.is_active == True).limit(1)
+    ).first()
+    if active_admin is None:
+        admin_id = conn.execute(select(users.c.id).where(users.c.username == 'admin')).scalar()
+        if admin_id is not None:
+            conn.execute(update(users).where(users.c.id == admin_id).values(is_admin=True, is_active=True))
+            print("已将用户 'admin' 设置为活跃管理员")
+        else:
+            conn.execute(insert(users).values(
+                username='admin', password=generate_password_hash('admin'), is_admin=True, is_active=True
+            ))
+            print("创建了默认管理员账户: admin/admin")
+
+    if conn.execute(select(categories.c.id).limit(1)).first() is None:
+        conn.execute(insert(categories).values(name='未分类'))
+        catalog.bump_version(conn, catalog.CATEGORY_ROW)
+        print("创建了默认分类: 未分类")
+
+
+def bootstrap(app):
+    """
+    建库、建表、补列/索引并初始化管理员与默认分类，可重复执行（flask init）。
+    所有步骤共用应用的引擎；建表、补列、建索引与初始化数据在同一个事务中完成，
+    PostgreSQL / SQLite 上中途失败会整体回滚（MySQL 的 DDL 会隐式提交）。
+    """
+    backend = app.extensions['sales_backend']
+    with app.app_context():
+        if not wait_for_database(app, backend):
+            print("数据库初始化失败，应用无法启动。")
+            print("请手动创建数据库或检查数据库配置。")
+            exit(1)
+
+        try:
+            # 分区表等需要单独执行的准备（仅PostgreSQL开启分区时）
+            backend.prepare_schema(app)
+            with db.engine.begin() as conn:
+                print(f"数据库连接正常: {conn.execute(text(backend.VERSION_QUERY)).scalar()}")
+                db.metadata.create_all(conn)  # 只在主库建表，副本由复制同步
+                # create_all 不会修改已存在的表，补加后续版本新增的列和索引
+                for table in db.metadata.sorted_tables:
+                    added = ensure_columns(conn, table)
+                    if added:
+                        print(f"表 {table.name} 新增列: {', '.join(added)}")
+                    ensure_indexes(conn, table)
+                backend.create_search_index(conn)
+                seed(conn)
+            stats.ensure_built()
+        except Exception as e:
+            print(f"初始化数据库失败: {e}")
+            print("请检查数据库连接和权限。")
+            exit(1)
+
+        print("数据库初始化完成。")
+
+
+def init_on_start(app):
+    """python app*.py 直接启动时按 INIT_ON_START 初始化数据库；生产部署时改为先执行 flask init"""
+    # 调试模式的重载器会在子进程中再次执行入口文件，只在首次启动时初始化
+    if app.config['INIT_ON_START'] and not os.environ.get('WERKZEUG_RUN_MAIN'):
+        bootstrap(app)
+
+
+if __name__ == '__main__':
+    app = create_app()
+    init_on_start(app)
+    app.run(debug=True)
@@ -0,0 +1,209 @@
+"""
+静态资源指纹与长缓存。
+
+模板中用 static_url('style.css') 代替 url_for('static', ...)，得到带内容哈希的地址
+/assets/style.<哈希>.css；文件内容变化时地址随之变化，因此可以按
+Cache-Control: max-age=31536000, immutable 让浏览器长期缓存。
+
+- VENDOR：第三方库（Bootstrap、ECharts），部署时由 `flask assets-vendor` 下载到 static/vendor/，
+  页面只从本站加载，不访问CDN。缺少其中的文件时 create_app 直接报错（ASSETS_REQUIRE_VENDOR，
+  测试与 flask 命令除外，否则无法执行 assets-vendor 本身）。
+- BUNDLES：合并压缩的 CSS 包，bundle_urls('app.css') 返回引用该包所需的地址列表；
+  成员合并为一个文件，缺少的成员（仅在未做上述检查时）按 /static/ 地址单独列出。
+
+哈希与合并结果按文件修改时间缓存在进程内，文件更新后下一次请求自动重新计算。
+超过 COMPRESS_MIN_SIZE 的 CSS/JS 按编码（br/gzip）各压缩一次，与内容一起缓存，
+之后的请求直接返回压缩好的字节，compress_response 不再处理 /assets/ 的响应。
+/assets/ 与 /static/ 一样无需登录，只能访问 static 目录内的文件，其余地址返回 404。
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import urllib.request
+
+from flask import abort, current_app, request, url_for
+from werkzeug.security import safe_join
+
+from compression import COMPRESSIBLE_TYPES, choose_encoding, compress
+
+VENDOR = {
+    'vendor/bootstrap.min.css': 'https://cdnjs.snrat.com/ajax/libs/bootstrap/5.3.7/css/bootstrap.min.css',
+    'vendor/bootstrap.bundle.min.js': 'https://cdnjs.snrat.com/ajax/libs/bootstrap/5.3.7/js/bootstrap.bundle.min.js',
+    'vendor/echarts.min.js': 'https://cdnjs.snrat.com/ajax/libs/echarts/6.0.0/echarts.min.js',
+}
+
+# 合并顺序即引用顺序，第三方库放在前面
+BUNDLES = {
+    'app.css': ['vendor/bootstrap.min.css', 'style.css'],
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', re.S)
+
+
+def minify_css(text):
+    """去掉注释和多余空白（字符串内容保持不变）"""
+    parts = []
+    for i, part in enumerate(_CSS_TOKENS.split(text)):
+        if i % 2:
+            if not part.startswith('/*'):
+                parts.append(part)
+            continue
+        part = re.sub(r'\s+', ' ', part)
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)
+        parts.append(part.replace(';}', '}'))
+    return ''.join(parts).strip()
+
+
+def fingerprint(filename, digest):
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+class AssetRegistry:
+    """逻辑文件名 → (修改时间, 哈希, 内容, {编码: 压缩后的内容}) 的进程内缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _path(self, filename):
+        """static 目录内的文件路径；含 ..、绝对路径等越出 static 目录的文件名返回 None"""
+        return safe_join(current_app.static_folder, filename)
+
+    def _sources(self, name):
+        if name in BUNDLES:
+            return [m for m in BUNDLES[name] if os.path.exists(self._path(m))]
+        return [name]
+
+    def get(self, name):
+        """返回 (哈希, 内容)；文件不存在或不在 static 目录内时返回 None"""
+        path = self._path(name)
+        if path is None or (name not in BUNDLES and not os.path.isfile(path)):
+            return None
+        sources = self._sources(name)
+        try:
+            stamp = tuple((m, os.path.getmtime(self._path(m))) for m in sources)
+        except OSError:
+            return None
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == stamp:
+            return entry[1], entry[2]
+        if name in BUNDLES:
+            chunks = []
+            for member in sources:
+                with open(self._path(member), encoding='utf-8') as f:
+                    text = f.read()
+                chunks.append(text if '.min.' in member else minify_css(text))
+            content = '\n'.join(chunks).encode('utf-8')
+        else:
+            with open(self._path(name), 'rb') as f:
+                content = f.read()
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        with self._lock:
+            self._entries[name] = (stamp, digest, content, {})
+        return digest, content
+
+    def compressed(self, name, digest, encoding, config):
+        """get() 所返回内容的压缩结果，同一哈希与编码只压缩一次"""
+        entry = self._entries.get(name)
+        if entry is None or entry[1] != digest:
+            return None
+        variants = entry[3]
+        data = variants.get(encoding)
+        if data is None:
+            data = compress(entry[2], encoding, config)
+            with self._lock:
+                variants[encoding] = data
+        return data
+
+
+registry = AssetRegistry()
+
+
+def static_url(filename):
+    """带内容哈希的静态资源地址；文件不存在时返回普通的 /static/ 地址"""
+    asset = registry.get(filename)
+    if asset is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=fingerprint(filename, asset[0]))
+
+
+def bundle_urls(name):
+    """引用合并包所需的地址：缺少的成员单独列出，其余成员合并为一个文件"""
+    urls = [url_for('static', filename=m) for m in BUNDLES[name]
+            if not os.path.exists(registry._path(m))]
+    return urls + [static_url(name)]
+
+
+def serve_asset(filename):
+    root, ext = os.path.splitext(filename)
+    name, _, digest = root.rpartition('.')
+    if not name:
+        abort(404)
+    asset = registry.get(name + ext)
+    if asset is None:
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0]
+    content = asset[1]
+    headers = {}
+    config = current_app.config
+    if (config['COMPRESS_ENABLED'] and mimetype in COMPRESSIBLE_TYPES
+            and len(content) >= config['COMPRESS_MIN_SIZE']):
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is not None:
+            data = registry.compressed(name + ext, asset[0], encoding, config)
+            if data is not None:
+                content = data
+                headers['Content-Encoding'] = encoding
+    response = current_app.response_class(content, mimetype=mimetype, headers=headers)
+    if asset[0] == digest:
+        response.headers['Cache-Control'] = IMMUTABLE
+    else:
+        # 部署期间旧页面引用了旧哈希：返回当前内容，但不长期缓存
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def download_vendor(static_folder):
+    """下载第三方库到 static/vendor/，返回下载的文件名"""
+    downloaded = []
+    for filename, url in VENDOR.items():
+        path = os.path.join(static_folder, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            content = resp.read()
+        with open(path, 'wb') as f:
+            f.write(content)
+        downloaded.append(filename)
+        print(f"已下载 {filename}（{len(content) // 1024}KB）")
+    return downloaded
+
+
+def missing_vendor(static_folder):
+    """static/vendor/ 中尚未下载的第三方库"""
+    return [f for f in VENDOR if not os.path.isfile(os.path.join(static_folder, f))]
+
+
+def init_app(app):
+    # flask 命令（assets-vendor、init 等）加载应用时不检查
+    if (app.config['ASSETS_REQUIRE_VENDOR'] and not app.testing
+            and os.environ.get('FLASK_RUN_FROM_CLI') != 'true'):
+        missing = missing_vendor(app.static_folder)
+        if missing:
+            raise RuntimeError(f"static/ 下缺少第三方库 {', '.join(missing)}，"
+                               f"请先执行 flask --app <入口> assets-vendor")
+
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(static_url)
+    app.add_template_global(bundle_urls)
+
+    @app.cli.command('assets-vendor')
+    def assets_vendor():
+        """把 Bootstrap、ECharts 下载到 static/vendor/，不再依赖CDN"""
+        download_vendor(app.static_folder)
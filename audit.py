@@ -0,0 +1,146 @@
+"""
+操作日志的后写（write-behind）管道。
+
+普通操作日志先放入进程内队列，由后台线程按条数（AUDIT_BATCH_SIZE）或时间
+（AUDIT_FLUSH_INTERVAL 秒）批量插入，不再为每条日志单独提交一次事务。
+进程退出时会把队列中剩余的日志全部写入。
+
+与销售记录关联的日志（进货/销售/撤回）不走队列，而是和销售记录在同一事务中
+写入，见 views.log_action。
+
+PostgreSQL 分区后 log.sale_id 没有数据库外键（见 backends/pg_partitions.py），
+由 _check_log_sale_refs 在 ORM 写入时保证引用的销售记录存在；批量删除销售记录时
+utils.delete_products 会先解除日志的引用。
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import event, inspect, insert, select, update
+
+from routing import RoutingSession
+
+
+class AuditQueue:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._pending = []
+        self.engine = None
+        self.table = None
+        self.enabled = False
+        self.batch_size = 100
+        self.interval = 2.0
+
+    def init_app(self, app):
+        from models import db, Log
+
+        self.batch_size = app.config['AUDIT_BATCH_SIZE']
+        self.interval = app.config['AUDIT_FLUSH_INTERVAL']
+        # 测试或关闭时退化为同步写入，每条日志立即落库
+        self.enabled = app.config['AUDIT_ASYNC'] and not app.testing
+        self.table = Log.__table__
+        with app.app_context():
+            self.engine = db.engine
+        app.extensions['audit'] = self
+        atexit.register(self.shutdown)
+
+    def enqueue(self, user_id, action):
+        self._queue.put({'user_id': user_id, 'action': action, 'ts': datetime.now()})
+        if not self.enabled:
+            self.flush()
+            return
+        self._ensure_worker()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        # gunicorn 等 fork 模型下，子进程需要重新启动自己的写入线程
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"写入操作日志失败，稍后重试: {e}")
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def flush(self):
+        """把队列中的日志批量写入数据库，返回写入条数"""
+        with self._lock:
+            rows = self._pending + self._drain()
+            self._pending = []
+            if not rows:
+                return 0
+            try:
+                for i in range(0, len(rows), self.batch_size):
+                    with self.engine.begin() as conn:
+                        conn.execute(insert(self.table), rows[i:i + self.batch_size])
+            except Exception:
+                # 保留未写入的日志，下次再试
+                self._pending = rows[i:]
+                raise
+            return len(rows)
+
+    def shutdown(self):
+        """进程退出时停止后台线程并写入剩余日志"""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._wakeup.set()
+            self._thread.join(timeout=5)
+        for attempt in range(3):
+            try:
+                self.flush()
+                return
+            except Exception as e:
+                print(f"退出时写入操作日志失败（第{attempt + 1}次）: {e}")
+                time.sleep(0.5)
+
+
+audit_queue = AuditQueue()
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _check_log_sale_refs(session, flush_context, instances):
+    from models import Log, Sale
+
+    # 经关系（log.sale = sale）关联的日志在 flush 时才填 sale_id，这里只核对直接赋值的ID
+    referenced = {obj.sale_id for obj in list(session.new) + list(session.dirty)
+                  if isinstance(obj, Log) and obj.sale_id is not None
+                  and inspect(obj).attrs.sale_id.history.added}
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Sale)]
+    if not (referenced or deleted):
+        return
+    conn = session.connection()
+    if referenced:
+        existing = set(conn.execute(select(Sale.id).where(Sale.id.in_(referenced))).scalars())
+        missing = sorted(referenced - existing)
+        if missing:
+            raise ValueError(f"日志引用的销售记录不存在: {missing}")
+    if deleted:
+        conn.execute(update(Log.__table__).where(Log.__table__.c.sale_id.in_(deleted)).values(sale_id=None))
@@ -0,0 +1,93 @@
+"""
+数据库后端层。
+
+每种数据库一个模块（sqlite / mysql / postgres），统一提供：
+- DEFAULT_URI: 默认连接串
+- VERSION_QUERY: 健康检查使用的版本查询
+- engine_options(config): 调优后的 SQLALCHEMY_ENGINE_OPTIONS
+- init_app(app): 引擎事件、命令行等后端专属初始化
+- prepare_schema(app): create_all 之前的建表准备（如PostgreSQL分区表）
+- upsert(model, rows, index_elements, update_columns): 批量 upsert 语句
+- search_filter(column, keyword): 商品名模糊搜索条件
+- create_search_index(bind): 建立搜索所需索引
+- create_database_if_not_exists(engine): 启动时建库（复用应用的引擎连接目标库）
+- merge_products(conn, targets, version): 可选，大批量导入商品的快速合并（仅PostgreSQL）
+- set_statement_timeout(conn, ms) / is_statement_timeout(error): 按视图的语句超时（见 limits.py）
+
+ensure_indexes / ensure_columns / create_search_index 既可传引擎（各自开事务），
+也可传连接，在调用方的事务中执行（flask init 在一个事务中完成建表与初始化）。
+"""
+from contextlib import contextmanager
+from importlib import import_module
+
+from flask import current_app
+from sqlalchemy import inspect, literal, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.engine import make_url
+
+BACKENDS = {
+    'sqlite': 'backends.sqlite',
+    'mysql': 'backends.mysql',
+    'postgresql': 'backends.postgres',
+}
+
+
+def load_backend(name):
+    """按后端名（sqlite/mysql/postgresql）加载后端模块"""
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的数据库类型: {name}")
+    return import_module(BACKENDS[name])
+
+
+def backend_for_uri(uri):
+    """根据 SQLALCHEMY_DATABASE_URI 选择后端模块"""
+    return load_backend(make_url(uri).get_backend_name())
+
+
+def get_backend():
+    """当前应用使用的后端模块"""
+    return current_app.extensions['sales_backend']
+
+
+@contextmanager
+def begin(bind):
+    """传入连接时沿用调用方的事务，传入引擎时开启新事务"""
+    if isinstance(bind, Connection):
+        yield bind
+    else:
+        with bind.begin() as conn:
+            yield conn
+
+
+def ensure_indexes(bind, table):
+    """为已存在的表补建模型中声明的索引（create_all 不会给旧表加索引）"""
+    for index in table.indexes:
+        index.create(bind, checkfirst=True)
+
+
+def column_default_sql(column, dialect):
+    """模型中标量 default=（如 is_reversed 的 False）对应的 DEFAULT 子句，没有时返回空串"""
+    default = column.default
+    if default is None or not default.is_scalar:
+        return ''
+    value = literal(default.arg, type_=column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+    return f" DEFAULT {value}"
+
+
+def ensure_columns(bind, table):
+    """
+    为已存在的表补加模型中新增的列（新增列须可为空），返回补加的列名。
+    带标量默认值的列以 DEFAULT 补加，已有行取该默认值而不是 NULL
+    （否则 is_reversed IS NULL 的旧销售记录会被 is_reversed == False 的过滤条件排除）。
+    """
+    existing = {c['name'] for c in inspect(bind).get_columns(table.name)}
+    missing = [c for c in table.columns if c.name not in existing]
+    preparer = bind.dialect.identifier_preparer
+    with begin(bind) as conn:
+        for column in missing:
+            conn.execute(text(
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.quote(column.name)} {column.type.compile(dialect=bind.dialect)}"
+                f"{column_default_sql(column, bind.dialect)}"
+            ))
+    return [c.name for c in missing]
@@ -0,0 +1,120 @@
+"""
+PostgreSQL / MySQL 逻辑备份与恢复（flask dump / flask restore）。
+
+备份目录结构：每张表一个 gzip 压缩的 CSV 文件，加一个 manifest.json 记录
+表的恢复顺序、列名和行数。数据逐块读写，内存占用与 sale、log 表大小无关。
+具体的逐表导出/导入由各后端提供的 dump_table / restore_table 完成。
+"""
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+
+import click
+
+MANIFEST = 'manifest.json'
+# 逐块读写的行数
+DUMP_CHUNK_ROWS = 5000
+
+
+def open_table_file(path, mode):
+    """以文本方式打开 gzip 压缩的 CSV 文件"""
+    return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding='utf-8', newline='')
+
+
+def quote_table(engine, table):
+    return engine.dialect.identifier_preparer.format_table(table)
+
+
+def quote_columns(engine, columns):
+    preparer = engine.dialect.identifier_preparer
+    return ', '.join(preparer.quote(c) for c in columns)
+
+
+def register_commands(app, dump_table, restore_table, reset_sequences=None):
+    """
+    注册 dump / restore 命令。
+
+    dump_table(raw_connection, engine, table, fileobj) -> 行数
+    restore_table(raw_connection, engine, table, columns, fileobj) -> 行数
+    reset_sequences(raw_connection, engine, table): 恢复后修正自增序列（可选）
+    """
+    from models import db
+
+    @app.cli.command('dump')
+    @click.argument('dest', required=False)
+    def dump(dest):
+        """导出所有表到备份目录（每表一个 .csv.gz）"""
+        dest = dest or os.path.join('dumps', f"dump_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(dest, exist_ok=True)
+        engine = db.engine
+        manifest = {
+            'backend': engine.dialect.name,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'tables': [],
+        }
+        raw = engine.raw_connection()
+        try:
+            # 同一个只读快照事务内导出全部表，保证各表数据一致
+            cursor = raw.cursor()
+            cursor.execute(app.extensions['sales_backend'].SNAPSHOT_SQL)
+            cursor.close()
+            for table in db.metadata.sorted_tables:
+                filename = f'{table.name}.csv.gz'
+                with open_table_file(os.path.join(dest, filename), 'w') as f:
+                    rows = dump_table(raw, engine, table, f)
+                manifest['tables'].append({
+                    'name': table.name,
+                    'file': filename,
+                    'columns': [c.name for c in table.columns],
+                    'rows': rows,
+                })
+                print(f"已导出 {table.name}: {rows} 行")
+            raw.rollback()
+        finally:
+            raw.close()
+        with open(os.path.join(dest, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        print(f"备份完成: {dest}")
+
+    @app.cli.command('restore')
+    @click.argument('src')
+    @click.option('--truncate', is_flag=True, help='恢复前清空现有数据')
+    def restore(src, truncate):
+        """从 flask dump 生成的目录恢复数据（表结构需已由 create_all 创建）"""
+        with open(os.path.join(src, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['backend'] != db.engine.dialect.name:
+            raise click.ClickException(
+                f"备份来自 {manifest['backend']}，当前数据库为 {db.engine.dialect.name}")
+
+        engine = db.engine
+        tables = {t.name: t for t in db.metadata.sorted_tables}
+        entries = [e for e in manifest['tables'] if e['name'] in tables]
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            if truncate:
+                for entry in reversed(entries):
+                    cursor.execute(f"DELETE FROM {quote_table(engine, tables[entry['name']])}")
+            else:
+                for entry in entries:
+                    cursor.execute(f"SELECT 1 FROM {quote_table(engine, tables[entry['name']])} LIMIT 1")
+                    if cursor.fetchone():
+                        raise click.ClickException(f"表 {entry['name']} 不为空，请使用 --truncate")
+            cursor.close()
+            for entry in entries:
+                table = tables[entry['name']]
+                with open_table_file(os.path.join(src, entry['file']), 'r') as f:
+                    rows = restore_table(raw, engine, table, entry['columns'], f)
+                if reset_sequences:
+                    reset_sequences(raw, engine, table)
+                print(f"已恢复 {table.name}: {rows} 行")
+            raw.commit()
+        except Exception:
+            raw.rollback()
+            raise
+        finally:
+            raw.close()
+        print("恢复完成。")
@@ -0,0 +1,251 @@
+"""
+PostgreSQL 按月范围分区：sale 按 created_at、log 按 ts。
+
+开启 PG_PARTITIONING 后，新库在启动时直接建成分区表；已有数据的库用
+`flask pg-partition-migrate` 分批迁移。每次启动/flask init 以及 `flask pg-partitions`
+都会预建未来 PG_PARTITION_MONTHS_AHEAD 个月的分区，建议再配合 cron 每月执行一次。
+仪表盘等带日期范围的查询可据此做分区裁剪。
+
+没有对应月分区的行落入 *_default 分区。之后再建该月分区时，先把默认分区摘下，
+建好月分区并把默认分区中属于该月的行移入，再挂回默认分区（否则 CREATE ... PARTITION OF
+会因默认分区中已有该范围的行而失败）。
+
+限制：分区表上的主键/唯一约束必须包含分区键，因此 sale/log 主键变为 (id, 分区键)，
+sale.id 单独不再唯一，log.sale_id 无法再建指向 sale 的外键，迁移时会移除该外键。
+数据库不再保证 log.sale_id 的引用完整性，改由应用检查（见 audit.py）。
+"""
+from datetime import date
+
+import click
+from sqlalchemy import BigInteger, text
+
+from backends import ensure_indexes
+
+# 分区表及其分区键
+PARTITIONED = {
+    'sale': 'created_at',
+    'log': 'ts',
+}
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(d, n):
+    month = d.month - 1 + n
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table_name, start):
+    return f'{table_name}_y{start.year}m{start.month:02d}'
+
+
+def relkind(conn, table_name):
+    """'r' 普通表，'p' 分区表，None 不存在"""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {'name': table_name},
+    ).scalar()
+
+
+def partitioned_table_ddl(engine, table):
+    """根据模型列生成 PARTITION BY RANGE 建表语句"""
+    key = PARTITIONED[table.name]
+    preparer = engine.dialect.identifier_preparer
+    columns = []
+    pk_columns = []
+    for column in table.columns:
+        if column.primary_key:
+            type_sql = 'BIGSERIAL' if isinstance(column.type, BigInteger) else 'SERIAL'
+            pk_columns.append(preparer.quote(column.name))
+        else:
+            type_sql = column.type.compile(dialect=engine.dialect)
+        parts = [preparer.quote(column.name), type_sql]
+        if column.name == key:
+            parts.append('NOT NULL')
+        for fk in column.foreign_keys:
+            # 分区表的 id 单独不唯一（主键含分区键），不能作为外键的引用目标
+            if fk.column.table.name in PARTITIONED:
+                continue
+            parts.append(f'REFERENCES {preparer.format_table(fk.column.table)} '
+                         f'({preparer.quote(fk.column.name)})')
+        columns.append(' '.join(parts))
+    columns.append(f"PRIMARY KEY ({', '.join(pk_columns + [preparer.quote(key)])})")
+    return (f"CREATE TABLE IF NOT EXISTS {preparer.format_table(table)} (\n    "
+            + ',\n    '.join(columns)
+            + f"\n) PARTITION BY RANGE ({preparer.quote(key)})")
+
+
+def create_partitioned_tables(engine, tables):
+    with engine.begin() as conn:
+        for table in tables:
+            conn.execute(text(partitioned_table_ddl(engine, table)))
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table.name}_default "
+                f"PARTITION OF {table.name} DEFAULT"
+            ))
+    for table in tables:
+        ensure_indexes(engine, table)
+
+
+def create_monthly_partition(conn, table_name, month):
+    """
+    创建一个月分区。默认分区中已有该月的行时，先摘下默认分区，建好月分区后把这些行
+    移入，再挂回默认分区；摘挂期间对父表加排他锁，只在默认分区确有该月数据时发生。
+    """
+    key = PARTITIONED[table_name]
+    default = f'{table_name}_default'
+    name = partition_name(table_name, month)
+    bounds = {'lower': month, 'upper': add_months(month, 1)}
+    create_sql = (f"CREATE TABLE {name} PARTITION OF {table_name} "
+                  f"FOR VALUES FROM ('{bounds['lower'].isoformat()}') TO ('{bounds['upper'].isoformat()}')")
+    in_month = f"{key} >= :lower AND {key} < :upper"
+    if relkind(conn, default) is None or not conn.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"), bounds).scalar():
+        conn.execute(text(create_sql))
+        return 0
+    conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {default}"))
+    conn.execute(text(create_sql))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) "
+        f"INSERT INTO {table_name} SELECT * FROM moved"
+    ), bounds).rowcount
+    conn.execute(text(f"ALTER TABLE {table_name} ATTACH PARTITION {default} DEFAULT"))
+    print(f"{name}: 已从默认分区移入 {moved} 行")
+    return moved
+
+
+def create_monthly_partitions(engine, table_name, start, end):
+    """创建 [start, end) 范围内缺失的月分区，返回新建的分区名"""
+    created = []
+    month = month_start(start)
+    while month < end:
+        name = partition_name(table_name, month)
+        # 每个分区一个事务，摘挂默认分区时的排他锁不跨多个月
+        with engine.begin() as conn:
+            if relkind(conn, name) is None:
+                create_monthly_partition(conn, table_name, month)
+                created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def create_upcoming_partitions(engine, months_ahead):
+    """为当月及之后 months_ahead 个月建立分区"""
+    this_month = month_start(date.today())
+    created = []
+    with engine.connect() as conn:
+        tables = [name for name in PARTITIONED if relkind(conn, name) == 'p']
+    for name in tables:
+        created += create_monthly_partitions(engine, name, this_month, add_months(this_month, months_ahead + 1))
+    return created
+
+
+def prepare_schema(app):
+    """启动时在 create_all 之前建好分区表（仅对尚不存在的 sale/log 生效）"""
+    from models import db
+
+    if not app.config['PG_PARTITIONING']:
+        return
+    engine = db.engine
+    with engine.connect() as conn:
+        existing = {name: relkind(conn, name) for name in PARTITIONED}
+    if any(kind == 'r' for kind in existing.values()):
+        print("sale/log 仍为普通表，请执行 flask pg-partition-migrate 迁移为分区表")
+        return
+    if all(kind == 'p' for kind in existing.values()):
+        # 已是分区表：每次启动顺带预建后续月份，避免新数据落入默认分区
+        created = create_upcoming_partitions(engine, app.config['PG_PARTITION_MONTHS_AHEAD'])
+        if created:
+            print(f"已创建分区: {', '.join(created)}")
+        return
+
+    tables = [t for t in db.metadata.sorted_tables if t.name in PARTITIONED]
+    others = [t for t in db.metadata.sorted_tables if t.name not in PARTITIONED]
+    db.metadata.create_all(engine, tables=others)
+    create_partitioned_tables(engine, tables)
+    created = create_upcoming_partitions(engine, app.config['PG_PARTITION_MONTHS_AHEAD'])
+    if created:
+        print(f"已创建分区: {', '.join(created)}")
+
+
+def migrate_table(engine, table, batch_size):
+    """把普通表改名为 *_legacy，建分区表后分批搬迁数据"""
+    key = PARTITIONED[table.name]
+    legacy = f'{table.name}_legacy'
+    preparer = engine.dialect.identifier_preparer
+    columns = ', '.join(preparer.quote(c.name) for c in table.columns)
+
+    with engine.begin() as conn:
+        if relkind(conn, table.name) == 'r':
+            # 改名旧表及其索引/约束，避免与新分区表重名
+            conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy}"))
+            for (index_name,) in conn.execute(text(
+                    "SELECT indexname FROM pg_indexes WHERE tablename = :t"), {'t': legacy}).all():
+                conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"'))
+            conn.execute(text(partitioned_table_ddl(engine, table)))
+            conn.execute(text(f"CREATE TABLE {table.name}_default PARTITION OF {table.name} DEFAULT"))
+            # 新表的自增序列接在旧数据之后，迁移期间的新写入不会与旧ID冲突
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {legacy}), false)"
+            ))
+        if relkind(conn, legacy) is None:
+            return 0
+        bounds = conn.execute(text(f"SELECT MIN({key}), MAX({key}) FROM {legacy}")).one()
+    ensure_indexes(engine, table)
+
+    if bounds[0] is not None:
+        create_monthly_partitions(engine, table.name, bounds[0].date(), add_months(bounds[1].date(), 1))
+
+    moved = 0
+    while True:
+        # 每批一个短事务，不长时间锁表
+        with engine.begin() as conn:
+            count = conn.execute(text(
+                f"WITH batch AS ("
+                f"  DELETE FROM {legacy} WHERE id IN (SELECT id FROM {legacy} ORDER BY id LIMIT :n)"
+                f"  RETURNING {columns}"
+                f") INSERT INTO {table.name} ({columns}) SELECT {columns} FROM batch"
+            ), {'n': batch_size}).rowcount
+        if not count:
+            break
+        moved += count
+        print(f"{table.name}: 已迁移 {moved} 行")
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {legacy}"))
+    return moved
+
+
+def register_commands(app):
+    from models import db
+
+    @app.cli.command('pg-partitions')
+    @click.option('--months', default=None, type=int, help='预建未来几个月的分区')
+    def pg_partitions(months):
+        """预建 sale/log 未来月份的分区"""
+        months = app.config['PG_PARTITION_MONTHS_AHEAD'] if months is None else months
+        created = create_upcoming_partitions(db.engine, months)
+        print(f"已创建分区: {', '.join(created)}" if created else "分区已是最新")
+
+    @app.cli.command('pg-partition-migrate')
+    @click.option('--batch', 'batch_size', default=None, type=int, help='每批迁移的行数')
+    def pg_partition_migrate(batch_size):
+        """把已有的 sale/log 普通表迁移为按月分区表"""
+        batch_size = batch_size or app.config['PG_PARTITION_BATCH']
+        engine = db.engine
+        with engine.begin() as conn:
+            # 分区后 sale.id 单独不唯一，无法再被外键引用：移除 log.sale_id 的外键，改由应用检查
+            for (constraint, table_name) in conn.execute(text(
+                    "SELECT conname, conrelid::regclass::text FROM pg_constraint "
+                    "WHERE contype = 'f' AND confrelid = to_regclass('sale')")).all():
+                conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{constraint}"'))
+        for table in db.metadata.sorted_tables:
+            if table.name in PARTITIONED:
+                moved = migrate_table(engine, table, batch_size)
+                print(f"{table.name} 迁移完成，共 {moved} 行")
+        created = create_upcoming_partitions(engine, app.config['PG_PARTITION_MONTHS_AHEAD'])
+        if created:
+            print(f"已创建分区: {', '.join(created)}")
@@ -0,0 +1,160 @@
+"""
+连接池参数与指标。
+
+各后端的 engine_options 通过 pool_options() 生成连接池参数：.env 中的 DB_POOL_* 优先，
+未设置时使用后端自己的默认值。
+
+DB_POOL_PRE_PING 三种模式：
+- always: SQLAlchemy 的 pool_pre_ping，每次取连接都先 ping 一次（多一次往返）
+- idle:   只对空闲超过 DB_POOL_PING_IDLE 秒的连接 ping，繁忙时基本没有额外往返
+- off:    不 ping，依靠 pool_recycle 与出错后重连
+
+连接池使用 MeteredQueuePool，记录取连接耗时、溢出连接（超出 pool_size 的连接）次数与
+取连接超时次数；连接池满或取连接超时时记警告日志。/api/pool-stats 返回本进程的指标，
+用于按 gunicorn worker 数与 PgBouncer 连接上限确定 pool_size + max_overflow。
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+PRE_PING_MODES = ('always', 'idle', 'off')
+# 保留最近多少次取连接耗时用于计算分位数
+LATENCY_SAMPLES = 1000
+# 连接池已满的警告最短间隔（秒）
+SATURATED_WARNING_INTERVAL = 60
+
+
+class MeteredQueuePool(QueuePool):
+    """带指标的 QueuePool；ping_idle / slow_checkout 由 metered_pool() 设置"""
+
+    ping_idle = None
+    slow_checkout = 0.1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self._saturated_warned_at = 0.0
+        # recreate() 传入的 _dispatch 已带有原连接池的监听器
+        if self.ping_idle is not None and '_dispatch' not in kwargs:
+            event.listen(self, 'checkout', self._ping_if_idle)
+            event.listen(self, 'checkin', self._mark_checkin)
+
+    def recreate(self):
+        pool = super().recreate()
+        # dispose() 后新建的连接池沿用原来的计数
+        pool.checkouts, pool.overflow_checkouts = self.checkouts, self.overflow_checkouts
+        pool.timeouts, pool.peak_checked_out = self.timeouts, self.peak_checked_out
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            logger.warning(f"数据库连接池耗尽：{self._timeout}秒内未取到连接（{self.status()}）")
+            raise
+        elapsed = time.perf_counter() - start
+        checked_out = self.checkedout()
+        with self._metrics_lock:
+            self._latencies.append(elapsed)
+            self.checkouts += 1
+            if checked_out > self.size():
+                self.overflow_checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+        if elapsed > self.slow_checkout:
+            logger.warning(f"取数据库连接耗时 {elapsed * 1000:.0f}ms（{self.status()}）")
+        if self._max_overflow >= 0 and checked_out >= self.size() + self._max_overflow:
+            now = time.monotonic()
+            if now - self._saturated_warned_at > SATURATED_WARNING_INTERVAL:
+                self._saturated_warned_at = now
+                logger.warning(f"数据库连接池已满（{self.status()}），后续请求将排队等待")
+        return connection
+
+    def _mark_checkin(self, dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+
+    def _ping_if_idle(self, dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get('checked_in_at')
+        if checked_in_at is None or time.monotonic() - checked_in_at < self.ping_idle:
+            return
+        try:
+            self._dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            # 连接池会丢弃该连接并重新取一个
+            raise exc.DisconnectionError(f"空闲连接已失效: {e}") from e
+
+    def metrics(self):
+        with self._metrics_lock:
+            latencies = sorted(self._latencies)
+            result = {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': self.checkedout(),
+                'checked_in': self.checkedin(),
+                'overflow': self.overflow(),
+                'peak_checked_out': self.peak_checked_out,
+                'checkouts': self.checkouts,
+                'overflow_checkouts': self.overflow_checkouts,
+                'timeouts': self.timeouts,
+            }
+        if latencies:
+            result.update({
+                'checkout_ms_p50': round(latencies[len(latencies) // 2] * 1000, 3),
+                'checkout_ms_p99': round(latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000, 3),
+                'checkout_ms_max': round(latencies[-1] * 1000, 3),
+            })
+        return result
+
+
+def metered_pool(ping_idle, slow_checkout):
+    """生成带参数的连接池类（create_engine 的 poolclass 须为类）"""
+    return type('MeteredQueuePool', (MeteredQueuePool,), {
+        'ping_idle': ping_idle,
+        'slow_checkout': slow_checkout,
+    })
+
+
+def pool_options(config, pool_size, max_overflow, pool_recycle=-1, pool_timeout=30, pre_ping='idle'):
+    """连接池参数：DB_POOL_* 配置优先，否则使用传入的后端默认值"""
+    def setting(key, default):
+        value = config.get(key)
+        return default if value is None else value
+
+    pre_ping = setting('DB_POOL_PRE_PING', pre_ping)
+    if pre_ping not in PRE_PING_MODES:
+        raise ValueError(f"DB_POOL_PRE_PING 须为 {'/'.join(PRE_PING_MODES)}: {pre_ping}")
+    return {
+        'poolclass': metered_pool(
+            config['DB_POOL_PING_IDLE'] if pre_ping == 'idle' else None,
+            config['DB_POOL_SLOW_CHECKOUT_MS'] / 1000,
+        ),
+        'pool_size': setting('DB_POOL_SIZE', pool_size),
+        'max_overflow': setting('DB_MAX_OVERFLOW', max_overflow),
+        'pool_timeout': setting('DB_POOL_TIMEOUT', pool_timeout),
+        'pool_recycle': setting('DB_POOL_RECYCLE', pool_recycle),
+        'pool_pre_ping': pre_ping == 'always',
+        'pool_use_lifo': config['DB_POOL_USE_LIFO'],
+    }
+
+
+def engine_metrics(engines):
+    """各引擎（主库/副本）连接池的指标"""
+    result = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        if isinstance(pool, MeteredQueuePool):
+            result[name or 'default'] = pool.metrics()
+    return result
@@ -0,0 +1,238 @@
+"""SQLite 后端"""
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+
+import click
+
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import make_url
+
+from backends import ensure_indexes
+from backends.pool import pool_options
+
+NAME = 'sqlite'
+DEFAULT_URI = 'sqlite:///sales.db'
+VERSION_QUERY = 'SELECT sqlite_version()'
+
+# 压缩备份时每次读取的字节数
+BACKUP_COPY_CHUNK = 1024 * 1024
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {
+        'connect_args': {
+            # 等待写锁的秒数，避免并发写入时立即报 database is locked
+            'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000,
+        }
+    }
+    if url.database and url.database != ':memory:':
+        # 文件数据库使用 QueuePool，连接本地文件无需 pre_ping
+        options.update(pool_options(config, pool_size=10, max_overflow=20, pre_ping='off'))
+    return options
+
+
+def sqlite_pragmas(config):
+    """根据配置生成每个新连接要执行的 PRAGMA 列表"""
+    if not config['SQLITE_PRAGMAS_ENABLED']:
+        return []
+    return [
+        # WAL 模式下读写互不阻塞，只有写与写之间串行
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        # WAL 下 NORMAL 仍保证一致性，只在断电时可能丢失最后几个事务
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        # 负数表示 KiB，例如 -64000 约为 64MB 页缓存
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('temp_store', config['SQLITE_TEMP_STORE']),
+        ('foreign_keys', 'ON' if config['SQLITE_FOREIGN_KEYS'] else 'OFF'),
+    ]
+
+
+def init_app(app):
+    from models import db
+
+    pragmas = sqlite_pragmas(app.config)
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    with app.app_context():
+        engine = db.engine
+        if pragmas:
+            event.listen(engine, 'connect', set_sqlite_pragmas)
+
+    interval = app.config['SQLITE_OPTIMIZE_INTERVAL']
+    if interval > 0 and not app.testing:
+        lock = threading.Lock()
+
+        # 收到第一个请求时才启动，flask 命令等不处理请求的进程不启动维护线程；
+        # gunicorn --preload 时在各 worker 中分别启动
+        @app.before_request
+        def _start_maintenance():
+            if 'sqlite_maintenance' in app.extensions:
+                return
+            with lock:
+                if 'sqlite_maintenance' not in app.extensions:
+                    app.extensions['sqlite_maintenance'] = start_maintenance(engine, interval)
+
+    @app.cli.command('sqlite-optimize')
+    def sqlite_optimize():
+        """执行 PRAGMA optimize 并做一次 WAL checkpoint"""
+        busy, log_frames, checkpointed = run_maintenance(engine, 'TRUNCATE')
+        print(f"optimize 完成，WAL 帧数: {log_frames}，已写回: {checkpointed}，busy: {busy}")
+
+    @app.cli.command('backup-db')
+    @click.option('--dest', default=None, help='备份目录，默认 SQLITE_BACKUP_DIR')
+    @click.option('--pages', default=None, type=int, help='每步复制的页数，默认 SQLITE_BACKUP_PAGES')
+    @click.option('--sleep', 'sleep_seconds', default=None, type=float, help='每步之间的休眠秒数')
+    @click.option('--compress/--no-compress', default=None,
+                  help='是否gzip压缩备份文件（先在备份目录生成未压缩的临时副本再压缩，需预留与数据库同样大小的空间）')
+    @click.option('--keep', default=None, type=int, help='保留最近的备份份数，0为不清理')
+    def backup_db(dest, pages, sleep_seconds, compress, keep):
+        """在线备份SQLite数据库（不阻塞写入）"""
+        config = app.config
+        source = engine.url.database
+        if not source or source == ':memory:':
+            print("内存数据库无法备份")
+            return
+        dest = dest or config['SQLITE_BACKUP_DIR']
+        backup_path = backup_database(
+            source, dest,
+            pages=pages or config['SQLITE_BACKUP_PAGES'],
+            sleep_seconds=config['SQLITE_BACKUP_SLEEP'] if sleep_seconds is None else sleep_seconds,
+            compress=config['SQLITE_BACKUP_COMPRESS'] if compress is None else compress,
+        )
+        print(f"已创建备份: {backup_path}")
+        removed = prune_backups(dest, config['SQLITE_BACKUP_KEEP'] if keep is None else keep)
+        for path in removed:
+            print(f"已删除过期备份: {path}")
+
+
+def backup_database(source, dest_dir, pages=256, sleep_seconds=0.05, compress=False):
+    """
+    使用 sqlite3 备份API分步复制数据库。
+
+    每步只复制 pages 页，步间休眠 sleep_seconds 秒让出写锁；包含WAL中已提交
+    的数据，得到的是一致的快照。
+
+    备份API只能写入数据库文件，无法直接输出到gzip流：压缩时先在 dest_dir 中备份到
+    未压缩的临时文件，再分块写入gzip，期间需要额外一份数据库大小的磁盘空间。
+    文件名精确到微秒，同一秒内的多次备份不会互相覆盖。
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.db"
+    target_path = os.path.join(dest_dir, name)
+    tmp_path = target_path + '.tmp'
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst, pages=pages, sleep=sleep_seconds)
+    finally:
+        dst.close()
+        src.close()
+
+    if compress:
+        target_path += '.gz'
+        with open(tmp_path, 'rb') as f_in, gzip.open(target_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, BACKUP_COPY_CHUNK)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, target_path)
+    return target_path
+
+
+def prune_backups(dest_dir, keep):
+    """只保留最近 keep 份备份，返回被删除的文件"""
+    if keep <= 0 or not os.path.isdir(dest_dir):
+        return []
+    backups = sorted(
+        f for f in os.listdir(dest_dir)
+        if f.startswith('backup_') and (f.endswith('.db') or f.endswith('.db.gz'))
+    )
+    removed = []
+    for name in backups[:-keep]:
+        path = os.path.join(dest_dir, name)
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def run_maintenance(engine, checkpoint_mode='PASSIVE'):
+    """
+    更新查询规划器统计信息并把 WAL 写回主库。
+    PASSIVE 模式不等待读写者，不会阻塞正在进行的销售写入。
+    """
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA optimize')
+        result = conn.exec_driver_sql(f'PRAGMA wal_checkpoint({checkpoint_mode})').fetchone()
+    return tuple(result) if result else (0, 0, 0)
+
+
+def start_maintenance(engine, interval):
+    """后台守护线程，每 interval 秒执行一次 run_maintenance"""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                run_maintenance(engine)
+            except Exception as e:
+                print(f"SQLite定期维护失败: {e}")
+
+    thread = threading.Thread(target=loop, name='sqlite-maintenance', daemon=True)
+    thread.start()
+    return stop
+
+
+def prepare_schema(app):
+    pass
+
+
+def upsert(model, rows, index_elements, update_columns=None):
+    stmt = insert(model).values(rows)
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={col: stmt.excluded[col] for col in update_columns},
+    )
+
+
+def set_statement_timeout(conn, ms):
+    # SQLite 没有语句超时
+    pass
+
+
+def is_statement_timeout(error):
+    return False
+
+
+def search_filter(column, keyword):
+    # SQLite 的 LIKE 对 ASCII 不区分大小写；前导 % 无法走索引，商品表规模下可接受
+    return column.like(f'%{keyword}%')
+
+
+def create_search_index(bind):
+    from models import Product
+    ensure_indexes(bind, Product.__table__)
+
+
+def create_database_if_not_exists(engine):
+    """SQLite 首次连接时自动建库，只需确保所在目录存在（相对路径位于 instance 目录，由 Flask-SQLAlchemy 创建）"""
+    database = engine.url.database
+    if database and os.path.isabs(database):
+        directory = os.path.dirname(database)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+    return True
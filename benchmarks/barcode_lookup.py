@@ -0,0 +1,128 @@
+"""
+扫码查询延迟基准：不同商品数量下按条码查商品的 p50/p99，对比按名称 LIKE 搜索。
+
+- 未缓存：条码唯一索引查询
+- 已缓存：进程内缓存命中后按主键取商品
+- 接口：经 /api/products/by-code/<code> 完整请求（含会话、序列化）
+
+用法：
+    python benchmarks/barcode_lookup.py --sizes 10000,100000,1000000 --lookups 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert  # noqa: E402
+
+import catalog  # noqa: E402
+from app import create_app  # noqa: E402
+from backends import get_backend  # noqa: E402
+from models import db, User, Category, Product  # noqa: E402
+
+INSERT_CHUNK = 50000
+
+
+def build_app(db_path, size):
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(username='bench', password='x', is_admin=True, is_active=True)
+        category = Category(name='基准')
+        db.session.add_all([admin, category])
+        db.session.commit()
+        for start in range(0, size, INSERT_CHUNK):
+            rows = [{'name': f'商品{i}', 'barcode': f'69{i:011d}', 'price': 1, 'stock': 100,
+                     'category_id': category.id}
+                    for i in range(start, min(start + INSERT_CHUNK, size))]
+            db.session.execute(insert(Product), rows)
+        db.session.commit()
+        return app, admin.id
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+def time_lookups(app, codes):
+    samples = []
+    with app.app_context():
+        for code in codes:
+            start = time.perf_counter()
+            product = catalog.find_by_code(code)
+            samples.append(time.perf_counter() - start)
+            assert product is not None
+            # 模拟每个请求使用新的会话（不复用 identity map）
+            db.session.remove()
+    return samples
+
+
+def time_endpoint(app, user_id, codes):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    samples = []
+    for code in codes:
+        start = time.perf_counter()
+        resp = client.get(f'/api/products/by-code/{code}')
+        samples.append(time.perf_counter() - start)
+        assert resp.status_code == 200
+    return samples
+
+
+def time_keyword(app, size, count):
+    samples = []
+    with app.app_context():
+        for _ in range(count):
+            keyword = f'商品{random.randrange(size)}'
+            start = time.perf_counter()
+            Product.query.filter(get_backend().search_filter(Product.name, keyword)).limit(12).all()
+            samples.append(time.perf_counter() - start)
+            db.session.remove()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='商品数量，逗号分隔')
+    parser.add_argument('--lookups', type=int, default=2000, help='每种方式的查询次数')
+    parser.add_argument('--keyword-lookups', type=int, default=50, help='LIKE 搜索的次数')
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            app, user_id = build_app(os.path.join(tmp, 'bench.db'), size)
+            print(f"\n商品数 {size}（建库 {time.perf_counter() - start:.1f}s）")
+            codes = [f'69{random.randrange(size):011d}' for _ in range(args.lookups)]
+
+            catalog._code_cache.clear()
+            app.config['BARCODE_CACHE_SIZE'] = 0  # 每次都走条码索引
+            cold = time_lookups(app, codes)
+            app.config['BARCODE_CACHE_SIZE'] = len(codes)
+            time_lookups(app, codes)  # 预热缓存
+            warm = time_lookups(app, codes)
+            endpoint = time_endpoint(app, user_id, codes)
+            keyword = time_keyword(app, size, args.keyword_lookups)
+
+            for label, samples in (('条码索引', cold), ('缓存命中', warm),
+                                   ('接口请求', endpoint), ('名称LIKE', keyword)):
+                p50, p99 = percentiles(samples)
+                print(f"  {label}: p50 {p50:.3f}ms  p99 {p99:.3f}ms")
+            with app.app_context():
+                db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
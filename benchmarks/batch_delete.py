@@ -0,0 +1,104 @@
+"""
+批量删除的语句数与耗时：经 /products/batch_delete 和 /categories/batch 删除 N 个商品/分类。
+
+每个商品带若干销售记录和关联日志，统计整个请求发出的 SQL 语句数。
+
+用法：
+    python benchmarks/batch_delete.py --sizes 500,5000 --sales 3
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert, select  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, User, Category, Product, Sale, Log  # noqa: E402
+
+
+def build_app(db_path, size, sales_per_product):
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'WTF_CSRF_ENABLED': False,
+        'AUDIT_ASYNC': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(username='bench', password='x', is_admin=True, is_active=True)
+        db.session.add(admin)
+        db.session.commit()
+        db.session.execute(insert(Category), [{'name': f'分类{i}'} for i in range(size + 1)])
+        category_ids = db.session.execute(select(Category.id).order_by(Category.id)).scalars().all()
+        # 最后一个分类保留给商品，用于验证“仍有商品的分类不能删除”
+        db.session.execute(insert(Product), [
+            {'name': f'商品{i}', 'price': 1, 'stock': 10, 'category_id': category_ids[-1]} for i in range(size)
+        ])
+        product_ids = db.session.execute(select(Product.id)).scalars().all()
+        db.session.execute(insert(Sale), [
+            {'product_id': pid, 'quantity': 1, 'type': 'out', 'amount': 1, 'user_id': admin.id, 'is_reversed': False}
+            for pid in product_ids for _ in range(sales_per_product)
+        ])
+        sale_ids = db.session.execute(select(Sale.id)).scalars().all()
+        db.session.execute(insert(Log), [{'user_id': admin.id, 'action': '销售', 'sale_id': sid} for sid in sale_ids])
+        db.session.commit()
+        return app, admin.id, product_ids, category_ids
+
+
+def counted(app, fn):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        start = time.perf_counter()
+        resp = fn()
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert resp.status_code == 302, resp.status_code
+    return len(statements), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='500,5000', help='删除数量，逗号分隔')
+    parser.add_argument('--sales', type=int, default=3, help='每个商品的销售记录数')
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            app, user_id, product_ids, category_ids = build_app(os.path.join(tmp, 'bench.db'), size, args.sales)
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+                sess['_fresh'] = True
+            # 这两个视图手动校验 CSRF 令牌，从页面中取一个
+            page = client.get('/categories').data.decode()
+            token = re.search(r'name="csrf-token" content="([^"]+)"', page).group(1)
+
+            count, elapsed = counted(app, lambda: client.post('/categories/batch', data={
+                'csrf_token': token, 'action': 'delete', 'category_ids': [str(cid) for cid in category_ids]}))
+            print(f"删除 {size} 个分类: {count} 条语句，{elapsed * 1000:.0f}ms")
+
+            count, elapsed = counted(app, lambda: client.post('/products/batch_delete', data={
+                'csrf_token': token, 'product_ids': ','.join(map(str, product_ids))}))
+            with app.app_context():
+                remaining = db.session.query(Sale).count() + db.session.query(Product).count()
+                orphaned = db.session.query(Log).filter(Log.sale_id.isnot(None)).count()
+                db.engine.dispose()
+            print(f"删除 {size} 个商品（{size * args.sales} 条销售记录）: {count} 条语句，"
+                  f"{elapsed * 1000:.0f}ms，剩余 {remaining} 行，仍引用销售记录的日志 {orphaned} 条")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+响应压缩的字节/CPU 取舍，以及条件GET（304）相对完整渲染的耗时。
+
+对每页 100 个商品的 /products、/sales、/sales-simple、/logs 和全量 /api/catalog，
+比较 gzip 各级别（及安装了 Brotli 时的 br 各级别）的压缩后大小与压缩耗时。
+
+用法：
+    python benchmarks/compression.py --products 100 --repeat 50
+"""
+import argparse
+import gzip
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+import compression  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, User, Category, Product, Sale, Log  # noqa: E402
+
+PAGES = ('/products', '/sales', '/sales-simple', '/logs', '/api/catalog')
+
+
+def build_app(db_path, products):
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'PER_PAGE': products,
+        'COMPRESS_ENABLED': False,
+        'AUDIT_ASYNC': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(username='bench', password='x', is_admin=True, is_active=True)
+        db.session.add(admin)
+        db.session.commit()
+        db.session.execute(insert(Category), [{'name': f'分类{i}'} for i in range(10)])
+        category_ids = db.session.execute(select(Category.id)).scalars().all()
+        db.session.execute(insert(Product), [
+            {'name': f'商品{i}', 'price': 1, 'stock': 10, 'version': 1,
+             'image': f'uploads/{i}.png', 'category_id': category_ids[i % 10]}
+            for i in range(products)
+        ])
+        product_ids = db.session.execute(select(Product.id)).scalars().all()
+        db.session.execute(insert(Sale), [
+            {'product_id': pid, 'quantity': 1, 'type': 'out', 'amount': 1, 'user_id': admin.id, 'is_reversed': False}
+            for pid in product_ids
+        ])
+        sale_ids = db.session.execute(select(Sale.id)).scalars().all()
+        db.session.execute(insert(Log), [
+            {'user_id': admin.id, 'action': f'销售:商品{i} 数量:1', 'sale_id': sid} for i, sid in enumerate(sale_ids)
+        ])
+        db.session.commit()
+        return app, admin.id
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples) * 1000
+
+
+def codecs():
+    yield from ((f'gzip-{level}', lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0))
+                for level in (1, 6, 9))
+    if compression.brotli is not None:
+        yield from ((f'br-{level}', lambda data, level=level: compression.brotli.compress(data, quality=level))
+                    for level in (1, 4, 11))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100, help='每页商品数')
+    parser.add_argument('--repeat', type=int, default=50, help='每项测量的重复次数')
+    args = parser.parse_args()
+    if compression.brotli is None:
+        print("未安装 Brotli，只测试 gzip")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app, user_id = build_app(os.path.join(tmp, 'bench.db'), args.products)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+
+        for url in PAGES:
+            resp, render_ms = timed(lambda: client.get(url), args.repeat)
+            data = resp.get_data()
+            etag = resp.headers.get('ETag')
+            print(f"\n{url}: {len(data) / 1024:.1f}KB，完整响应 {render_ms:.2f}ms")
+            if etag:
+                cached, cached_ms = timed(lambda: client.get(url, headers={'If-None-Match': etag}), args.repeat)
+                assert cached.status_code == 304, cached.status_code
+                print(f"  304: {cached_ms:.2f}ms")
+            for name, fn in codecs():
+                compressed, ms = timed(lambda: fn(data), args.repeat)
+                print(f"  {name:8s} {len(compressed) / 1024:7.1f}KB ({len(compressed) / len(data):5.1%})  {ms:.3f}ms")
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
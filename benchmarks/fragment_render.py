@@ -0,0 +1,105 @@
+"""
+模板片段缓存的渲染耗时：每页 100 个商品时 /products 与 /sales 的请求耗时和 SQL 语句数，
+对比不缓存（null）、首次渲染（缓存未命中）与缓存命中。
+
+商品分布在多个分类中，图片为本地路径（每个商品一次 url_for）。
+
+用法：
+    python benchmarks/fragment_render.py --products 100 --categories 20 --requests 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert, select  # noqa: E402
+
+import fragments  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db, User, Category, Product  # noqa: E402
+
+PAGES = ('/products', '/sales')
+
+
+def build_app(db_path, products, categories):
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'PER_PAGE': products,
+        'AUDIT_ASYNC': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(username='bench', password='x', is_admin=True, is_active=True)
+        db.session.add(admin)
+        db.session.commit()
+        db.session.execute(insert(Category), [{'name': f'分类{i}'} for i in range(categories)])
+        category_ids = db.session.execute(select(Category.id)).scalars().all()
+        db.session.execute(insert(Product), [
+            {'name': f'商品{i}', 'price': 1, 'stock': 10, 'version': 1,
+             'image': f'uploads/{i}.png', 'category_id': category_ids[i % categories]}
+            for i in range(products)
+        ])
+        db.session.commit()
+        return app, admin.id
+
+
+def measure(app, client, url, requests):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    samples = []
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            resp = client.get(url)
+            samples.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.status_code
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return statistics.median(samples) * 1000, len(statements) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100, help='每页商品数')
+    parser.add_argument('--categories', type=int, default=20, help='分类数')
+    parser.add_argument('--requests', type=int, default=200, help='每种情况的请求次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app, user_id = build_app(os.path.join(tmp, 'bench.db'), args.products, args.categories)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+
+        for url in PAGES:
+            client.get(url)  # 预热模板编译与分类缓存
+            app.jinja_env.fragment_cache = fragments.NullBackend()
+            null_ms, null_statements = measure(app, client, url, args.requests)
+
+            cache = fragments.MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'])
+            app.jinja_env.fragment_cache = cache
+            miss_ms, miss_statements = measure(app, client, url, 1)
+            hit_ms, hit_statements = measure(app, client, url, args.requests)
+
+            print(f"{url}（{args.products} 个商品）")
+            print(f"  不缓存:   {null_ms:.2f}ms  {null_statements:.0f} 条语句")
+            print(f"  首次渲染: {miss_ms:.2f}ms  {miss_statements:.0f} 条语句")
+            print(f"  缓存命中: {hit_ms:.2f}ms  {hit_statements:.0f} 条语句（缓存 {len(cache)} 条）")
+        with app.app_context():
+            db.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+并发销售写入基准：对比启用/关闭 SQLite 连接 PRAGMA 配置时 sales_operate 的吞吐。
+
+用法：
+    python benchmarks/sqlite_profile.py --threads 8 --ops 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, User, Category, Product  # noqa: E402
+
+
+def build_app(db_path, profile_enabled):
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SQLITE_PRAGMAS_ENABLED': profile_enabled,
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        admin = User(username='bench', password='x', is_admin=True, is_active=True)
+        category = Category(name='基准')
+        db.session.add_all([admin, category])
+        db.session.flush()
+        products = [Product(name=f'商品{i}', price=1, stock=10 ** 9, category_id=category.id) for i in range(20)]
+        db.session.add_all(products)
+        db.session.commit()
+        return app, admin.id, [p.id for p in products]
+
+
+def run(profile_enabled, threads, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        app, user_id, product_ids = build_app(os.path.join(tmp, 'bench.db'), profile_enabled)
+        errors = []
+        barrier = threading.Barrier(threads + 1)
+
+        def worker(n):
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+                sess['_fresh'] = True
+            barrier.wait()
+            for i in range(ops):
+                pid = product_ids[(n + i) % len(product_ids)]
+                try:
+                    resp = client.post(f'/sales/operate/{pid}', data={'quantity': 1, 'submit_out': '1'})
+                    if resp.status_code != 302:
+                        errors.append(resp.status_code)
+                except Exception as e:
+                    errors.append(repr(e))
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        for t in pool:
+            t.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            db.engine.dispose()
+        return threads * ops / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=200, help='每个线程的销售次数')
+    args = parser.parse_args()
+
+    for label, enabled in (('关闭PRAGMA配置', False), ('启用PRAGMA配置', True)):
+        throughput, error_count = run(enabled, args.threads, args.ops)
+        print(f"{label}: {throughput:.1f} 次/秒，失败 {error_count} 次")
+
+
+if __name__ == '__main__':
+    main()
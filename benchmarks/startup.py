@@ -0,0 +1,79 @@
+"""
+进程启动开销：在全新的解释器中 `import app` 并 create_app()，统计 -X importtime
+的导入总耗时和进程常驻内存（RSS），并检查 pandas、openpyxl、PIL 没有在启动时加载。
+
+可用 --budget-ms / --budget-mb 设定上限，超出或重型依赖被提前加载时以非 0 退出，
+便于放进 CI 作为启动开销的回归检查。
+
+用法：
+    python benchmarks/startup.py --runs 5 --budget-ms 800 --budget-mb 80
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只在导入、导出、验证码中用到，应按需加载
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'PIL')
+
+CHILD = """
+import json, resource, sys
+import app
+app.create_app(config={'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'ASSETS_REQUIRE_VENDOR': False})
+print(json.dumps({
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def import_total_ms(stderr):
+    """累加 -X importtime 输出中顶层模块的累计耗时（微秒）"""
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  ') and cumulative.strip().isdigit():
+            total += int(cumulative)
+    return total / 1000
+
+
+def run_once():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['import_ms'] = import_total_ms(result.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='启动次数，取中位数')
+    parser.add_argument('--budget-ms', type=float, help='导入总耗时上限（毫秒）')
+    parser.add_argument('--budget-mb', type=float, help='RSS 上限（MB）')
+    args = parser.parse_args()
+
+    reports = [run_once() for _ in range(args.runs)]
+    import_ms = statistics.median(r['import_ms'] for r in reports)
+    rss_mb = statistics.median(r['rss_mb'] for r in reports)
+    heavy = sorted({m for r in reports for m in r['heavy']})
+    print(f"导入耗时 {import_ms:.0f}ms，RSS {rss_mb:.1f}MB（{args.runs} 次中位数）")
+    print(f"启动时加载的重型依赖: {', '.join(heavy) or '无'}")
+
+    failed = bool(heavy)
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"导入耗时超出预算 {args.budget_ms:.0f}ms")
+        failed = True
+    if args.budget_mb is not None and rss_mb > args.budget_mb:
+        print(f"RSS 超出预算 {args.budget_mb:.0f}MB")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+商品目录版本号与增量变更。
+
+商品或分类经 ORM 写入时，在同一事务中递增 catalog_version 计数器，并把新版本号
+记在变更的商品上（product.version）；删除的商品记入 catalog_tombstone。
+计数器行锁使版本号按提交顺序递增，客户端按 since 拉取增量不会漏掉变更。
+分类改名时该分类下的商品一并更新版本号（目录项中包含分类名）。
+
+进货/销售只改库存，不递增版本号：否则每笔销售都要锁 catalog_version 的同一行，
+并发销售会被串行化。因此目录增量中不含库存；显示库存的列表页在版本戳中另加最新
+销售ID，库存所在的模板片段以库存为缓存键之一。撤回、编辑商品、导入等其他途径
+改库存时仍递增版本号（这些操作不新增销售记录）。
+
+注意：绕过 ORM 会话的批量 SQL（Query.delete/update、Core insert）不会触发版本递增，
+修改商品时需要自行调用 bump_version / record_deleted。
+
+find_by_code 按条码/SKU 查找商品，带进程内 LRU 缓存（条码 → 商品ID）。
+
+category_cache 是进程内的分类列表及各分类商品数缓存，供下拉框和分类管理页使用。
+分类增删改、商品新增/删除/改分类时递增分类版本号（catalog_version 表第 2 行）；
+本进程在提交后立即失效，其他进程最多 CATEGORY_CACHE_TTL 秒后比对版本号发现变化。
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+from sqlalchemy import event, func, insert, inspect, select, update
+
+from models import db, CatalogTombstone, CatalogVersion, Category, Product, Sale
+from routing import RoutingSession
+
+
+# catalog_version 表中各版本号所在行
+CATALOG_ROW = 1
+CATEGORY_ROW = 2
+
+CachedCategory = namedtuple('CachedCategory', 'id name product_count')
+
+
+def bump_version(conn, row=CATALOG_ROW):
+    """在当前事务中递增版本号并返回新值"""
+    table = CatalogVersion.__table__
+    stmt = update(table).where(table.c.id == row).values(value=table.c.value + 1)
+    if conn.dialect.update_returning:
+        # 递增与取回新值一次往返完成（PostgreSQL / SQLite）
+        value = conn.execute(stmt.returning(table.c.value)).scalar()
+        if value is not None:
+            return value
+    elif conn.execute(stmt).rowcount:
+        return conn.execute(select(table.c.value).where(table.c.id == row)).scalar_one()
+    conn.execute(insert(table).values(id=row, value=1))
+    return 1
+
+
+def mark_categories_changed(conn):
+    """批量 SQL 改动分类或商品归属后调用：递增分类版本号，提交后失效本进程缓存"""
+    bump_version(conn, CATEGORY_ROW)
+    db.session.info['categories_changed'] = True
+
+
+def record_deleted(conn, product_ids):
+    """批量 SQL 删除商品后调用：递增版本号并记录删除项"""
+    version = bump_version(conn)
+    if product_ids:
+        conn.execute(insert(CatalogTombstone.__table__),
+                     [{'product_id': pid, 'version': version} for pid in product_ids])
+    return version
+
+
+def current_version(row=CATALOG_ROW):
+    return db.session.execute(
+        select(CatalogVersion.value).where(CatalogVersion.id == row)
+    ).scalar() or 0
+
+
+def version_stamp():
+    """目录与分类的版本号（一次查询），用作列表页条件GET的版本戳"""
+    return tuple(db.session.execute(
+        select(CatalogVersion.id, CatalogVersion.value).order_by(CatalogVersion.id)
+    ).all())
+
+
+def changes_since(since):
+    """返回 (变更的商品, 删除的商品ID)"""
+    products = Product.query.options(db.joinedload(Product.category))\
+        .filter(Product.version > since).order_by(Product.id).all()
+    changed_ids = {p.id for p in products}
+    deleted = db.session.execute(
+        select(CatalogTombstone.product_id).where(CatalogTombstone.version > since).distinct()
+    ).scalars().all()
+    # SQLite 可能复用被删除的最大ID，重新出现的商品不算删除
+    return products, sorted(pid for pid in deleted if pid not in changed_ids)
+
+
+class CategoryCache:
+    """进程内分类缓存：分类列表（按ID排序）及各分类的商品数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._categories = []
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
+            self._version = None
+
+    def categories(self):
+        ttl = current_app.config['CATEGORY_CACHE_TTL']
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < ttl:
+            return self._categories
+        version = current_version(CATEGORY_ROW)
+        with self._lock:
+            if version != self._version:
+                self._categories = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._categories
+
+    def counts(self):
+        return {c.id: c.product_count for c in self.categories()}
+
+    @staticmethod
+    def _load():
+        # 分类列表与各分类商品数各一次查询
+        counts = dict(db.session.execute(
+            select(Product.category_id, func.count(Product.id)).group_by(Product.category_id)
+        ).all())
+        rows = db.session.execute(select(Category.id, Category.name).order_by(Category.id)).all()
+        return [CachedCategory(row.id, row.name, counts.get(row.id, 0)) for row in rows]
+
+
+category_cache = CategoryCache()
+
+
+# 条码 → 商品ID。命中后按主键取商品并核对条码，商品被删除或改码时自动失效，
+# 因此多进程部署下各进程的缓存无需同步
+_code_cache = OrderedDict()
+_code_cache_lock = threading.Lock()
+
+
+def find_by_code(code):
+    """按条码/SKU 查找商品，未找到返回 None"""
+    with _code_cache_lock:
+        pid = _code_cache.get(code)
+        if pid is not None:
+            _code_cache.move_to_end(code)
+    if pid is not None:
+        product = db.session.get(Product, pid)
+        if product is not None and product.barcode == code:
+            return product
+        with _code_cache_lock:
+            _code_cache.pop(code, None)
+
+    product = Product.query.filter_by(barcode=code).first()
+    if product is not None:
+        with _code_cache_lock:
+            _code_cache[code] = product.id
+            while len(_code_cache) > current_app.config['BARCODE_CACHE_SIZE']:
+                _code_cache.popitem(last=False)
+    return product
+
+
+def _only_stock_changed(product):
+    return all(attr.key == 'stock' for attr in inspect(product).attrs if attr.history.has_changes())
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _track_catalog_changes(session, flush_context, instances):
+    # 本次写入新增了销售记录（进货/销售/离线同步）时，只改了库存的商品不算目录变更
+    recording_sales = any(isinstance(obj, Sale) for obj in session.new)
+    products = [obj for obj in session.new if isinstance(obj, Product)]
+    products += [obj for obj in session.dirty
+                 if isinstance(obj, Product) and session.is_modified(obj, include_collections=False)
+                 and not (recording_sales and _only_stock_changed(obj))]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Product)]
+    renamed = [obj for obj in session.dirty
+               if isinstance(obj, Category) and session.is_modified(obj, include_collections=False)]
+    categories_changed = renamed or any(
+        isinstance(obj, Category) for obj in list(session.new) + list(session.deleted)
+    )
+    if not (products or deleted or categories_changed):
+        return
+
+    conn = session.connection()
+    # 分类本身或各分类的商品数有变化时递增分类版本号
+    if categories_changed or deleted or any(
+            p in session.new or inspect(p).attrs.category_id.history.has_changes() for p in products):
+        bump_version(conn, CATEGORY_ROW)
+        session.info['categories_changed'] = True
+    version = bump_version(conn)
+    for product in products:
+        product.version = version
+    if deleted:
+        conn.execute(insert(CatalogTombstone.__table__),
+                     [{'product_id': p.id, 'version': version} for p in deleted])
+    if renamed:
+        conn.execute(update(Product.__table__)
+                     .where(Product.__table__.c.category_id.in_([c.id for c in renamed]))
+                     .values(version=version))
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_category_cache(session):
+    if session.info.pop('categories_changed', False):
+        category_cache.invalidate()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_category_change(session):
+    session.info.pop('categories_changed', None)
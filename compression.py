@@ -0,0 +1,82 @@
+"""
+响应压缩。
+
+HTML、JSON、CSS、JS 响应在超过 COMPRESS_MIN_SIZE 字节时按客户端的 Accept-Encoding
+压缩：优先 brotli（需安装 Brotli 包，未安装时只用 gzip），其次 gzip。
+小响应压缩收益抵不过 CPU 开销，原样返回；文件下载等直通响应不处理。
+/assets/ 下的带哈希静态资源在 assets.py 中按内容压缩一次后缓存，这里不重复压缩。
+压缩级别与字节/CPU 的取舍见 benchmarks/compression.py。
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json',
+}
+
+
+def accepted_encodings(header):
+    """解析 Accept-Encoding，返回 q>0 的编码集合"""
+    encodings = set()
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_LEVEL'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def compress_response(response, request, config):
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or request.endpoint == 'asset'
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(compress(data, encoding, config))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    if not app.config['COMPRESS_ENABLED']:
+        return
+
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request, app.config)
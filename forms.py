@@ -31,6 +31,7 @@ class ResetPasswordForm(FlaskForm):
 
 class ProductForm(FlaskForm):
     name = StringField('商品名', validators=[DataRequired()])
+    barcode = StringField('条码/SKU', validators=[Optional(), Length(max=64)])
     price = FloatField('单价', validators=[DataRequired(), NumberRange(min=0)])
     stock = IntegerField('库存', validators=[DataRequired(), NumberRange(min=0)])
     category = SelectField('分类', coerce=int)
@@ -40,6 +41,7 @@ class ProductForm(FlaskForm):
 
 class ManualProductForm(FlaskForm):
     name = StringField('商品名', validators=[DataRequired()])
+    barcode = StringField('条码/SKU', validators=[Optional(), Length(max=64)])
     price = FloatField('单价', validators=[DataRequired(), NumberRange(min=0)])
     stock = IntegerField('库存', validators=[DataRequired(), NumberRange(min=0)])
     category = SelectField('分类', coerce=int)
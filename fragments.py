@@ -0,0 +1,111 @@
+"""
+模板片段缓存。
+
+模板中用 `{% cache 名称, 键1, 键2 ... %} ... {% endcache %}` 包住渲染结果只取决于
+这些键的片段，命中时直接输出缓存的 HTML，不再执行片段内的懒加载和 url_for。
+
+商品卡片/表格行以 (商品ID, product.version, product.stock) 为键：商品或其分类经 ORM
+修改时 catalog 会递增 product.version，销售只改库存（不递增版本号），旧条目都不会再被
+命中，由 LRU 逐步淘汰；因为键值存在数据库中，多进程部署下各进程的缓存同样不会读到旧内容。
+片段中不能包含随请求变化的内容（csrf_token、当前用户权限等），这些应放在片段外。
+
+缓存后端可替换（FRAGMENT_CACHE_BACKEND）：
+- memory: 进程内 LRU，最多 FRAGMENT_CACHE_SIZE 条
+- null: 不缓存，每次都渲染
+"""
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class MemoryBackend:
+    """进程内 LRU 缓存"""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class NullBackend:
+    """不缓存"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+BACKENDS = {
+    'memory': lambda config: MemoryBackend(config['FRAGMENT_CACHE_SIZE']),
+    'null': lambda config: NullBackend(),
+}
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 名称, 键... %} 片段缓存标签"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=NullBackend())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.Tuple(parts, 'load')]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value)
+        return value
+
+
+def init_app(app, backend=None):
+    """注册 {% cache %} 标签；backend 为空时按 FRAGMENT_CACHE_BACKEND 创建"""
+    if backend is None:
+        name = app.config['FRAGMENT_CACHE_BACKEND']
+        if name not in BACKENDS:
+            raise ValueError(f"不支持的片段缓存后端: {name}")
+        backend = BACKENDS[name](app.config)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = backend
+    app.extensions['fragment_cache'] = backend
@@ -0,0 +1,93 @@
+"""
+进销存表单的幂等令牌。
+
+页面加载时由浏览器为每个表单生成随机令牌（idempotency_key 字段），
+服务端在写入销售记录的同一事务中保存该令牌及处理结果（重定向地址和提示信息）。
+同一令牌再次提交（双击、网络重试、浏览器重新 POST）时只做一次主键查询，
+直接返回首次的结果，不再修改库存或新增销售记录。
+令牌保存 IDEMPOTENCY_TTL 秒，过期记录在写入时顺带清理。
+"""
+from datetime import datetime, timedelta
+
+from flask import abort, current_app, flash, redirect
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey
+
+FIELD = 'idempotency_key'
+# 清理过期令牌的间隔（秒）
+PURGE_INTERVAL = 3600
+
+_next_purge = datetime.min
+
+
+def request_key(form):
+    """表单中的令牌，未提供时返回 None（兼容未升级的页面）"""
+    key = (form.get(FIELD) or '').strip()
+    return key[:64] or None
+
+
+def _expired_before():
+    return datetime.now() - timedelta(seconds=current_app.config['IDEMPOTENCY_TTL'])
+
+
+def replay(key):
+    """令牌已处理过时返回首次的结果，否则返回 None"""
+    if not key:
+        return None
+    record = db.session.get(IdempotencyKey, key)
+    if record is None:
+        return None
+    if record.created_at < _expired_before():
+        # 过期令牌视为新请求，由本次结果覆盖
+        db.session.delete(record)
+        db.session.flush()
+        return None
+    if record.user_id != current_user.id:
+        abort(409)
+    flash(record.message, record.category)
+    return redirect(record.location)
+
+
+def purge_expired():
+    global _next_purge
+    now = datetime.now()
+    if now < _next_purge:
+        return
+    _next_purge = now + timedelta(seconds=PURGE_INTERVAL)
+    IdempotencyKey.query.filter(IdempotencyKey.created_at < _expired_before()).delete()
+
+
+def applied_keys(keys):
+    """批量同步用：一次查询返回其中已处理过的令牌"""
+    if not keys:
+        return set()
+    rows = db.session.query(IdempotencyKey.key).filter(IdempotencyKey.key.in_(keys)).all()
+    return {row.key for row in rows}
+
+
+def remember(key, location, message, category='message'):
+    """在当前事务中保存令牌的处理结果（随业务数据一起提交）"""
+    purge_expired()
+    db.session.add(IdempotencyKey(key=key, user_id=current_user.id,
+                                  location=location, message=message, category=category))
+
+
+def commit(key, location, message, category='message'):
+    """
+    提交当前事务并保存令牌的处理结果，返回重定向响应。
+    并发的重复提交会因主键冲突回滚，改为返回先完成的那次结果。
+    """
+    if key:
+        remember(key, location, message, category)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        replayed = replay(key)
+        if replayed is None:
+            raise
+        return replayed
+    flash(message, category)
+    return redirect(location)
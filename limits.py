@@ -0,0 +1,97 @@
+"""
+按视图的语句超时与重型请求限流。
+
+- @statement_timeout('REPORT_STATEMENT_TIMEOUT_MS')：本次请求中每条SQL的执行时间上限（毫秒，
+  取自对应配置项，0 为不限）。PostgreSQL 用 SET LOCAL statement_timeout，MySQL 用
+  max_execution_time（只限制 SELECT），SQLite 不支持，忽略。超时的查询由数据库中止，
+  视图返回 503。
+- @heavy()：导出、批量导入、深分页日志等重型视图，并带 HEAVY_STATEMENT_TIMEOUT_MS 的语句超时。
+  每个进程同时最多执行 HEAVY_MAX_CONCURRENT 个，已满时不排队，直接返回 503 与
+  Retry-After: HEAVY_RETRY_AFTER，连接池始终留有连接给销售写入等普通请求。
+  HEAVY_MAX_CONCURRENT 应明显小于 DB_POOL_SIZE + DB_MAX_OVERFLOW。
+
+销售写入等未标记的视图不设语句超时，也不受限流影响。
+"""
+import threading
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from werkzeug.exceptions import ServiceUnavailable
+
+from backends import get_backend
+from routing import RoutingSession
+
+
+def is_statement_timeout(error):
+    """OperationalError 是否由语句超时引起（此时不应判定数据库或副本故障）"""
+    return get_backend().is_statement_timeout(error)
+
+
+def _apply_timeout(connection):
+    get_backend().set_statement_timeout(connection, g.statement_timeout)
+
+
+@event.listens_for(RoutingSession, 'after_begin')
+def _set_statement_timeout(session, transaction, connection):
+    if has_app_context() and g.get('statement_timeout'):
+        _apply_timeout(connection)
+
+
+def _run_with_timeout(view, key, args, kwargs):
+    from models import db
+
+    timeout = current_app.config[key]
+    # 外层（如 @heavy）已设置超时时沿用外层的值
+    if not timeout or g.get('statement_timeout'):
+        return view(*args, **kwargs)
+    g.statement_timeout = timeout
+    try:
+        # 登录校验已在主库上开启了事务，该连接不会再触发 after_begin
+        if db.session().in_transaction():
+            _apply_timeout(db.session.connection())
+        return view(*args, **kwargs)
+    except OperationalError as e:
+        if not is_statement_timeout(e):
+            raise
+        db.session.rollback()
+        current_app.logger.warning(f"查询超过 {timeout}ms 被中止: {e}")
+        raise ServiceUnavailable("查询超时，请缩小查询范围后重试",
+                                 retry_after=current_app.config['HEAVY_RETRY_AFTER'])
+    finally:
+        g.statement_timeout = None
+
+
+def statement_timeout(key):
+    """视图中SQL的执行时间上限，key 为毫秒数所在的配置项"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return _run_with_timeout(view, key, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def heavy(when=None):
+    """标记重型视图；when() 返回 False 时（如导入页的 GET）按普通请求处理"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if when is not None and not when():
+                return view(*args, **kwargs)
+            slots = current_app.extensions['heavy_slots']
+            if not slots.acquire(blocking=False):
+                current_app.logger.warning(f"重型请求已达上限，拒绝 {view.__name__}")
+                raise ServiceUnavailable("系统繁忙，请稍后重试",
+                                         retry_after=current_app.config['HEAVY_RETRY_AFTER'])
+            try:
+                return _run_with_timeout(view, 'HEAVY_STATEMENT_TIMEOUT_MS', args, kwargs)
+            finally:
+                slots.release()
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.extensions['heavy_slots'] = threading.BoundedSemaphore(app.config['HEAVY_MAX_CONCURRENT'])
@@ -1,8 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+from routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,12 +21,16 @@ class Category(db.Model):
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128))
+    name = db.Column(db.String(128), index=True)
+    # 条码/SKU，可为空，非空时唯一
+    barcode = db.Column(db.String(64), unique=True, index=True)
     stock = db.Column(db.Integer, default=0)
     price = db.Column(db.Numeric(10, 2))
     image = db.Column(db.String(1024))
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     category = db.relationship('Category')
+    # 最后一次变更时的目录版本号，见 catalog.py
+    version = db.Column(db.BigInteger, index=True)
 
 class Sale(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +43,8 @@ class Sale(db.Model):
     product = db.relationship('Product')
     user = db.relationship('User')
     is_reversed = db.Column(db.Boolean, default=False)
+    # 商品销售流水按时间倒序分页
+    __table_args__ = (db.Index('ix_sale_product_created', 'product_id', 'created_at', 'id'),)
 
 class Log(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -46,4 +53,31 @@ class Log(db.Model):
     ts = db.Column(db.DateTime, default=datetime.now)
     user = db.relationship('User')
     sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), nullable=True)
-    sale = db.relationship('Sale')
\ No newline at end of file
+    sale = db.relationship('Sale')
+class IdempotencyKey(db.Model):
+    """已处理的表单提交令牌，重复提交时直接返回首次的结果"""
+    key = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    location = db.Column(db.String(255))
+    message = db.Column(db.String(255))
+    category = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+class CatalogVersion(db.Model):
+    """商品目录版本号（单行计数器），商品或分类变更时递增"""
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, default=0)
+
+class CatalogTombstone(db.Model):
+    """已删除商品的记录，供增量目录接口返回删除项"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer)
+    version = db.Column(db.BigInteger, index=True)
+
+class ProductStats(db.Model):
+    """商品累计进销数据，随销售/撤回在同一事务中增量更新，见 stats.py"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    out_qty = db.Column(db.BigInteger, default=0)
+    out_amount = db.Column(db.Numeric(14, 2), default=0)
+    in_qty = db.Column(db.BigInteger, default=0)
+    last_sold_at = db.Column(db.DateTime)
@@ -0,0 +1,107 @@
+"""
+读写分离：报表类只读页面走只读副本，其余请求及所有写操作走主库。
+
+- 配置 SQLALCHEMY_REPLICA_URI 后注册为 SQLALCHEMY_BINDS['replica']，未配置时一切照旧。
+- 用 @read_replica 标记只读视图，或在代码块中使用 with replica_reads()。
+- 本次请求已写入（flush）或当前会话在 REPLICA_PIN_SECONDS 内写过数据时固定读主库，
+  保证写后读一致（例如销售后重定向到仪表盘）。
+- 副本连接失败时标记为不可用 REPLICA_RETRY_SECONDS 秒，并在主库上重新执行该只读视图
+  （语句超时不算副本故障，见 limits.py）。
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+REPLICA_BIND = 'replica'
+PIN_SESSION_KEY = '_primary_until'
+
+# 副本不可用的截止时间（进程内共享）
+_replica_down_until = 0.0
+
+
+def replica_engine():
+    """已配置且当前可用的副本引擎，否则返回 None"""
+    if time.monotonic() < _replica_down_until:
+        return None
+    return current_app.extensions['sqlalchemy'].engines.get(REPLICA_BIND)
+
+
+def should_read_replica():
+    if not has_app_context() or not g.get('read_replica'):
+        return False
+    if g.get('db_wrote'):
+        return False
+    if has_request_context() and session.get(PIN_SESSION_KEY, 0) > time.time():
+        return False
+    return True
+
+
+class RoutingSession(Session):
+    """在只读上下文中把查询路由到副本，flush（写入）始终使用主库"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and should_read_replica():
+            engine = replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_wrote(session_, flush_context):
+    if has_app_context():
+        g.db_wrote = True
+
+
+def init_app(app):
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = replica_uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    @app.after_request
+    def pin_primary_after_write(response):
+        if g.get('db_wrote') and REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            session[PIN_SESSION_KEY] = time.time() + app.config['REPLICA_PIN_SECONDS']
+        return response
+
+
+@contextmanager
+def replica_reads():
+    """代码块内的查询读副本（用于命令行报表等非视图场景）"""
+    previous = g.get('read_replica', False)
+    g.read_replica = True
+    try:
+        yield
+    finally:
+        g.read_replica = previous
+
+
+def read_replica(view):
+    """标记只读视图：查询走副本，副本故障时回退主库重试一次"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        global _replica_down_until
+        from models import db
+
+        g.read_replica = True
+        try:
+            return view(*args, **kwargs)
+        except OperationalError as e:
+            from backends import get_backend
+            if replica_engine() is None or not should_read_replica() or get_backend().is_statement_timeout(e):
+                raise
+            db.session.rollback()
+            _replica_down_until = time.monotonic() + current_app.config['REPLICA_RETRY_SECONDS']
+            current_app.logger.warning(f"只读副本不可用，回退主库: {e}")
+            g.read_replica = False
+            return view(*args, **kwargs)
+        finally:
+            g.read_replica = False
+    return wrapper
@@ -0,0 +1,69 @@
+// 简易销售页的离线缓存
+// - /sales-simple 页面与 /api/catalog 商品目录：优先网络，离线时使用缓存
+// - 静态资源（含 /assets/ 下带哈希的文件）与 CDN 上的样式/脚本：优先缓存
+const CACHE_NAME = 'sales-simple-v1';
+const NETWORK_FIRST = ['/sales-simple', '/api/catalog'];
+
+self.addEventListener('install', function(event) {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', function(event) {
+    event.waitUntil(
+        caches.keys().then(function(names) {
+            return Promise.all(names.filter(name => name !== CACHE_NAME).map(name => caches.delete(name)));
+        }).then(() => self.clients.claim())
+    );
+});
+
+// 页面加载后通知缓存自身和商品目录（首次访问时页面尚未受控）
+self.addEventListener('message', function(event) {
+    if (event.data && event.data.type === 'cache') {
+        event.waitUntil(Promise.all(event.data.urls.map(url => fetchAndCache(new Request(url)))));
+    }
+});
+
+function cacheable(response) {
+    // 登录过期时会被重定向到登录页，不缓存；CDN 资源为 opaque 响应
+    return response && (response.ok || response.type === 'opaque') && !response.redirected;
+}
+
+function fetchAndCache(request) {
+    return fetch(request).then(function(response) {
+        if (cacheable(response)) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+        }
+        return response;
+    });
+}
+
+function networkFirst(request) {
+    return fetchAndCache(request).catch(function() {
+        return caches.match(request).then(function(cached) {
+            // 离线时带搜索条件的页面回退到缓存的首页
+            return cached || caches.match(request, {ignoreSearch: true});
+        });
+    });
+}
+
+function cacheFirst(request) {
+    return caches.match(request).then(cached => cached || fetchAndCache(request));
+}
+
+self.addEventListener('fetch', function(event) {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin) {
+        if (NETWORK_FIRST.includes(url.pathname)) {
+            event.respondWith(networkFirst(request));
+        } else if (url.pathname.startsWith('/static/') || url.pathname.startsWith('/assets/')) {
+            event.respondWith(cacheFirst(request));
+        }
+    } else if (/\.(css|js)$/.test(url.pathname)) {
+        event.respondWith(cacheFirst(request));
+    }
+});
@@ -0,0 +1,149 @@
+"""
+商品累计进销数据（product_stats）。
+
+新增 Sale、Sale 被撤回（is_reversed 置为 True）时，在同一事务中用原子的
+`col = col + :n` 增量更新对应商品的统计行，页面读取累计值时只需按主键取一行。
+统计行不存在时先用后端 upsert（冲突时不做任何事）补一行，并发写入也不会重复插入。
+
+绕过 ORM 会话直接写 sale 表的代码不会更新统计，可用 `flask product-stats --rebuild` 重建。
+"""
+from datetime import datetime
+
+import click
+from sqlalchemy import case, delete, event, func, inspect, select, update
+
+from backends import get_backend
+from models import db, Product, ProductStats, Sale
+from routing import RoutingSession
+
+STATS_COLUMNS = ('out_qty', 'out_amount', 'in_qty', 'last_sold_at')
+
+
+def _apply(conn, product_id, sign, sale):
+    """按一条销售记录增减统计（sign 为 1 记入，-1 撤回）"""
+    table = ProductStats.__table__
+    conn.execute(get_backend().upsert(ProductStats, [{
+        'product_id': product_id, 'out_qty': 0, 'out_amount': 0, 'in_qty': 0,
+    }], ['product_id']))
+    if sale.type == 'out':
+        values = {
+            'out_qty': table.c.out_qty + sign * sale.quantity,
+            'out_amount': table.c.out_amount + sign * (sale.amount or 0),
+        }
+        if sign > 0:
+            ts = sale.created_at
+            values['last_sold_at'] = case(
+                (table.c.last_sold_at.is_(None), ts),
+                (table.c.last_sold_at < ts, ts),
+                else_=table.c.last_sold_at,
+            )
+        else:
+            # 撤回后重新取最近一次有效销售时间
+            values['last_sold_at'] = select(func.max(Sale.created_at)).where(
+                Sale.product_id == product_id,
+                Sale.type == 'out',
+                Sale.is_reversed == False,
+                Sale.id != sale.id,
+            ).scalar_subquery()
+    elif sale.type == 'in':
+        values = {'in_qty': table.c.in_qty + sign * sale.quantity}
+    else:
+        return
+    conn.execute(update(table).where(table.c.product_id == product_id).values(**values))
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _track_sales(session, flush_context, instances):
+    added = [obj for obj in session.new if isinstance(obj, Sale) and not obj.is_reversed]
+    reversed_ = []
+    for obj in session.dirty:
+        if isinstance(obj, Sale):
+            history = inspect(obj).attrs.is_reversed.history
+            if history.added and history.added[0] and not any(history.deleted):
+                reversed_.append(obj)
+    deleted_products = [obj.id for obj in session.deleted if isinstance(obj, Product)]
+    if not (added or reversed_ or deleted_products):
+        return
+
+    conn = session.connection()
+    for sale in added:
+        if sale.created_at is None:
+            sale.created_at = datetime.now()
+        _apply(conn, sale.product_id, 1, sale)
+    for sale in reversed_:
+        _apply(conn, sale.product_id, -1, sale)
+    if deleted_products:
+        conn.execute(delete(ProductStats.__table__)
+                     .where(ProductStats.__table__.c.product_id.in_(deleted_products)))
+
+
+def computed_stats():
+    """从 sale 表汇总出的统计，{product_id: (out_qty, out_amount, in_qty, last_sold_at)}"""
+    is_out = Sale.type == 'out'
+    is_in = Sale.type == 'in'
+    rows = db.session.query(
+        Sale.product_id,
+        func.coalesce(func.sum(case((is_out, Sale.quantity), else_=0)), 0),
+        func.coalesce(func.sum(case((is_out, Sale.amount), else_=0)), 0),
+        func.coalesce(func.sum(case((is_in, Sale.quantity), else_=0)), 0),
+        func.max(case((is_out, Sale.created_at))),
+    ).join(Product, Product.id == Sale.product_id)\
+     .filter(Sale.is_reversed == False)\
+     .group_by(Sale.product_id).all()
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def stored_stats():
+    return {
+        s.product_id: (s.out_qty, s.out_amount, s.in_qty, s.last_sold_at)
+        for s in ProductStats.query.all()
+    }
+
+
+def differences(expected, stored):
+    """返回统计不一致的商品ID"""
+    empty = (0, 0, 0, None)
+    return sorted(
+        pid for pid in set(expected) | set(stored)
+        if _normalize(expected.get(pid, empty)) != _normalize(stored.get(pid, empty))
+    )
+
+
+def _normalize(values):
+    out_qty, out_amount, in_qty, last_sold_at = values
+    return (int(out_qty or 0), round(float(out_amount or 0), 2), int(in_qty or 0), last_sold_at)
+
+
+def rebuild():
+    """按 sale 表全量重建统计，返回写入的行数"""
+    expected = computed_stats()
+    db.session.execute(delete(ProductStats.__table__))
+    rows = [dict(zip(('product_id',) + STATS_COLUMNS, (pid,) + values)) for pid, values in expected.items()]
+    if rows:
+        db.session.execute(ProductStats.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def ensure_built():
+    """统计表为空而已有销售记录时（首次升级）全量构建"""
+    if not db.session.query(ProductStats.query.exists()).scalar() \
+            and db.session.query(Sale.query.exists()).scalar():
+        count = rebuild()
+        print(f"已根据销售记录生成 {count} 个商品的累计统计")
+
+
+def init_app(app):
+    @app.cli.command('product-stats')
+    @click.option('--rebuild', 'do_rebuild', is_flag=True, help='按销售记录全量重建统计')
+    def product_stats(do_rebuild):
+        """核对商品累计统计与销售记录是否一致"""
+        if do_rebuild:
+            print(f"已重建 {rebuild()} 个商品的统计")
+            return
+        mismatched = differences(computed_stats(), stored_stats())
+        if mismatched:
+            print(f"{len(mismatched)} 个商品统计不一致: {', '.join(map(str, mismatched[:50]))}")
+            print("执行 flask product-stats --rebuild 重建")
+            raise SystemExit(1)
+        print("商品统计与销售记录一致")
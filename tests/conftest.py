@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import bootstrap, create_app  # noqa: E402
+from catalog import category_cache  # noqa: E402
+from models import db, Category, Product, User  # noqa: E402
+
+
+def make_app(tmp_path, **config):
+    """临时 SQLite 库上的应用，已建表并创建 admin 管理员"""
+    app = create_app(config={
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'sales.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'WTF_CSRF_ENABLED': False,
+        'AUDIT_ASYNC': False,
+        'TESTING': True,
+        **config,
+    })
+    bootstrap(app)
+    # 分类缓存是进程级的，不能沿用上一个测试库的内容
+    category_cache.invalidate()
+    return app
+
+
+def login(client, app, username='admin'):
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(username=username).scalar()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+
+def add_user(app, username, is_admin=False):
+    """新增已激活的用户，返回用户ID"""
+    with app.app_context():
+        user = User(username=username, password='x', is_admin=is_admin, is_active=True)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def add_product(app, name='苹果', price=2, stock=10, **fields):
+    """在默认分类下新增商品，返回商品ID"""
+    with app.app_context():
+        category = Category.query.filter_by(name='未分类').one()
+        product = Product(name=name, price=price, stock=stock, category=category, **fields)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def csrf_token(client):
+    """手动校验 CSRF 的视图（批量删除等）需要页面中的令牌"""
+    page = client.get('/categories').data.decode()
+    return re.search(r'name="csrf-token" content="([^"]+)"', page).group(1)
+
+
+@contextmanager
+def count_statements(app):
+    """统计代码块内发出的 SQL 语句"""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    login(client, app)
+    return client
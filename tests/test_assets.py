@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+
+@pytest.mark.parametrize('path', [
+    '/assets/..%2Finstance%2Fsales.x.db',
+    '/assets/..%2Fapp.x.py',
+    '/assets/..%2F.env.x.sample',
+    '/assets/../app.x.py',
+    '/assets/%2Fetc%2Fpasswd.x',
+    '/assets/vendor.x',
+])
+def test_asset_outside_static_is_404(app, path):
+    # 未登录也不能越出 static 目录
+    assert app.test_client().get(path, follow_redirects=True).status_code == 404
+
+
+def test_fingerprinted_asset_is_immutable(app):
+    client = app.test_client()
+    with app.test_request_context():
+        from assets import static_url
+        url = static_url('style.css')
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert 'immutable' in resp.headers['Cache-Control']
+
+
+def test_missing_vendor_is_startup_error(tmp_path, monkeypatch):
+    import assets
+    from app import create_app
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI', raising=False)
+    monkeypatch.setitem(assets.VENDOR, 'vendor/missing.min.js', 'https://example.invalid/missing.min.js')
+    with pytest.raises(RuntimeError, match='assets-vendor'):
+        create_app(config={'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'sales.db'}"})
+
+
+@pytest.mark.parametrize('url', ['/', '/sales_detail'])
+def test_pages_never_reference_external_assets(client, url):
+    page = client.get(url).data.decode()
+    assert not re.search(r'(?:src|href)="(?:https?:)?//', page)
+
+
+def test_asset_is_compressed_once(app, monkeypatch):
+    import gzip
+    import assets
+    calls = []
+    real_compress = assets.compress
+    monkeypatch.setattr(assets.registry, '_entries', {})
+    monkeypatch.setattr(assets, 'compress', lambda *a: calls.append(a[1]) or real_compress(*a))
+    with app.test_request_context():
+        url = assets.static_url('style.css')
+    client = app.test_client()
+    bodies = [client.get(url, headers={'Accept-Encoding': 'gzip'}) for _ in range(3)]
+    assert calls == ['gzip']
+    assert all(r.headers['Content-Encoding'] == 'gzip' for r in bodies)
+    with open(f'{app.static_folder}/style.css', 'rb') as f:
+        assert gzip.decompress(bodies[-1].data) == f.read()
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
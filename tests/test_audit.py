@@ -0,0 +1,110 @@
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+import audit
+from audit import AuditQueue
+from conftest import add_product
+from models import db, Log, Product, Sale, User
+
+
+@pytest.fixture
+def sale_id(app):
+    with app.app_context():
+        product = Product(name='苹果', price=2, stock=10)
+        sale = Sale(product=product, quantity=1, type='out', amount=2, is_reversed=False)
+        db.session.add(sale)
+        db.session.commit()
+        return sale.id
+
+
+def test_log_must_reference_existing_sale(app, sale_id):
+    # PostgreSQL 分区后没有外键，由应用拒绝悬空引用
+    with app.app_context():
+        admin_id = db.session.scalar(select(User.id).where(User.username == 'admin'))
+        db.session.add(Log(user_id=admin_id, action='销售', sale_id=sale_id + 1))
+        with pytest.raises(ValueError):
+            db.session.commit()
+        db.session.rollback()
+        db.session.add(Log(user_id=admin_id, action='销售', sale_id=sale_id))
+        db.session.commit()
+
+
+def test_deleting_sale_unlinks_logs(app, sale_id):
+    with app.app_context():
+        log = Log(action='销售', sale_id=sale_id)
+        db.session.add(log)
+        db.session.commit()
+        db.session.delete(db.session.get(Sale, sale_id))
+        db.session.commit()
+        assert db.session.get(Log, log.id).sale_id is None
+
+
+@pytest.fixture
+def writer(app):
+    """开启后写的独立队列（测试配置下默认同步写入）"""
+    queue = AuditQueue()
+    queue.init_app(app)
+    queue.enabled = True
+    queue.batch_size = 3
+    queue.interval = 60
+    yield queue
+    queue.shutdown()
+
+
+@pytest.fixture
+def admin_id(app):
+    with app.app_context():
+        return db.session.scalar(select(User.id).where(User.username == 'admin'))
+
+
+def log_count(app):
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(Log))
+
+
+def wait_for_logs(app, expected, timeout=5):
+    deadline = time.monotonic() + timeout
+    while log_count(app) < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return log_count(app)
+
+
+def test_queue_writes_when_batch_is_full(app, writer, admin_id):
+    before = log_count(app)
+    writer.enqueue(admin_id, '操作1')
+    writer.enqueue(admin_id, '操作2')
+    time.sleep(0.1)
+    assert log_count(app) == before
+    writer.enqueue(admin_id, '操作3')
+    assert wait_for_logs(app, before + 3) == before + 3
+
+
+def test_queue_writes_after_interval(app, writer, admin_id):
+    writer.interval = 0.05
+    before = log_count(app)
+    writer.enqueue(admin_id, '操作1')
+    assert wait_for_logs(app, before + 1) == before + 1
+
+
+@pytest.mark.parametrize('method', ['flush', 'shutdown'])
+def test_queue_writes_on_flush_and_exit(app, writer, admin_id, method):
+    before = log_count(app)
+    writer.enqueue(admin_id, '操作1')
+    writer.enqueue(admin_id, '操作2')
+    # shutdown 由 atexit 在进程退出时调用
+    getattr(writer, method)()
+    assert log_count(app) == before + 2
+
+
+def test_sale_log_commits_with_sale(app, client, monkeypatch):
+    product_id = add_product(app)
+    queued = []
+    monkeypatch.setattr(audit.audit_queue, 'enqueue', lambda *args: queued.append(args))
+    client.post(f'/sales/operate/{product_id}', data={'quantity': '1', 'submit_out': '1'})
+    assert queued == []
+    with app.app_context():
+        sale = db.session.scalars(select(Sale)).one()
+        log = db.session.scalars(select(Log).where(Log.sale_id == sale.id)).one()
+        assert log.action.startswith('销售')
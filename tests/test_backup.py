@@ -0,0 +1,67 @@
+import gzip
+import shutil
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backends.sqlite import backup_database
+
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+        return conn.execute('SELECT id, note FROM item ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def open_backup(path, tmp_path):
+    if not str(path).endswith('.gz'):
+        return rows(path)
+    plain = tmp_path / 'restored.db'
+    with gzip.open(path, 'rb') as f_in, open(plain, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    return rows(plain)
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_backup_is_consistent_during_writes(tmp_path, compress):
+    source = tmp_path / 'sales.db'
+    conn = sqlite3.connect(source)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, note TEXT)')
+    conn.executemany('INSERT INTO item (note) VALUES (?)', [('x' * 200,)] * 2000)
+    conn.commit()
+    conn.close()
+
+    def write():
+        writer = sqlite3.connect(source, timeout=10)
+        for i in range(100):
+            writer.execute('INSERT INTO item (note) VALUES (?)', (f'w{i}',))
+            writer.commit()
+            time.sleep(0.002)
+        writer.close()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    path = backup_database(str(source), str(tmp_path / 'backups'), pages=5, sleep_seconds=0.001, compress=compress)
+    thread.join()
+
+    backup = open_backup(path, tmp_path)
+    # 备份是某一时刻的完整快照：与源库中相同范围的数据一致，没有缺行
+    assert len(backup) >= 2000
+    assert backup == rows(source)[:len(backup)]
+
+
+def test_backups_in_the_same_second_do_not_overwrite(tmp_path):
+    source = tmp_path / 'sales.db'
+    conn = sqlite3.connect(source)
+    conn.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, note TEXT)')
+    conn.close()
+    first = backup_database(str(source), str(tmp_path / 'backups'))
+    second = backup_database(str(source), str(tmp_path / 'backups'))
+    assert first != second
+    assert len(list((tmp_path / 'backups').iterdir())) == 2
@@ -0,0 +1,63 @@
+from sqlalchemy import func, insert, select
+
+from conftest import count_statements, csrf_token, login, make_app
+from models import db, User, Category, Product, Sale, Log
+
+
+def seed(app, size, sales_per_product=2):
+    """size 个空分类、size 个商品（归在另一个分类下），每个商品带销售记录及关联日志"""
+    with app.app_context():
+        admin_id = db.session.scalar(select(User.id).where(User.username == 'admin'))
+        db.session.execute(insert(Category), [{'name': f'分类{i}'} for i in range(size + 1)])
+        category_ids = db.session.scalars(select(Category.id).where(Category.name.like('分类%'))
+                                          .order_by(Category.id)).all()
+        db.session.execute(insert(Product), [
+            {'name': f'商品{i}', 'price': 1, 'stock': 10, 'category_id': category_ids[-1]} for i in range(size)
+        ])
+        product_ids = db.session.scalars(select(Product.id)).all()
+        db.session.execute(insert(Sale), [
+            {'product_id': pid, 'quantity': 1, 'type': 'out', 'amount': 1, 'user_id': admin_id, 'is_reversed': False}
+            for pid in product_ids for _ in range(sales_per_product)
+        ])
+        sale_ids = db.session.scalars(select(Sale.id)).all()
+        db.session.execute(insert(Log), [{'user_id': admin_id, 'action': '销售', 'sale_id': sid} for sid in sale_ids])
+        db.session.commit()
+        return product_ids, category_ids
+
+
+def delete_counts(tmp_path, size):
+    tmp_path.mkdir()
+    app = make_app(tmp_path)
+    product_ids, category_ids = seed(app, size)
+    client = app.test_client()
+    login(client, app)
+    token = csrf_token(client)
+
+    with count_statements(app) as statements:
+        resp = client.post('/categories/batch', data={
+            'csrf_token': token, 'action': 'delete', 'category_ids': [str(cid) for cid in category_ids]})
+    assert resp.status_code == 302
+    category_count = len(statements)
+
+    with count_statements(app) as statements:
+        resp = client.post('/products/batch_delete', data={
+            'csrf_token': token, 'product_ids': ','.join(map(str, product_ids))})
+    assert resp.status_code == 302
+    product_count = len(statements)
+
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(Product)) == 0
+        assert db.session.scalar(select(func.count()).select_from(Sale)) == 0
+        assert db.session.scalar(select(func.count()).where(Log.sale_id.isnot(None))) == 0
+        # 仍有商品的分类不能删除，删除商品前它应保留
+        assert db.session.scalar(select(func.count()).where(Category.name.like('分类%'))) == 1
+        db.engine.dispose()
+    return category_count, product_count
+
+
+def test_batch_delete_statement_count_is_independent_of_size(tmp_path):
+    small = delete_counts(tmp_path / 'small', 10)
+    large = delete_counts(tmp_path / 'large', 200)
+    # 批量删除按块执行 IN (...) 语句，不随删除数量逐行增加
+    assert small == large
+    assert max(large) <= 15
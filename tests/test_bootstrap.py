@@ -0,0 +1,33 @@
+import os
+import shutil
+
+from sqlalchemy import func, select
+
+from conftest import ROOT, make_app
+from models import db, Log, ProductStats, Sale
+
+# 仓库自带的旧版数据库：sale 表没有 is_reversed，log 表没有 sale_id 等后续版本新增的列
+BASELINE_DB = os.path.join(ROOT, 'instance', 'sales.db')
+
+
+def test_upgrade_baseline_database(tmp_path, capsys):
+    shutil.copy(BASELINE_DB, tmp_path / 'sales.db')
+    app = make_app(tmp_path)
+    with app.app_context():
+        sales = db.session.scalar(select(func.count()).select_from(Sale))
+        assert sales > 0
+        # 补加的 is_reversed 取模型默认值 False，旧销售记录仍计入报表和统计
+        assert db.session.scalar(select(func.count()).where(Sale.is_reversed.is_(None))) == 0
+        assert db.session.scalar(select(func.count()).where(Sale.is_reversed == False)) == sales  # noqa: E712
+        assert db.session.scalar(select(func.count()).select_from(ProductStats)) > 0
+        assert db.session.scalar(select(func.count()).select_from(Log)) > 0
+        db.engine.dispose()
+    assert '已根据销售记录生成 0 个' not in capsys.readouterr().out
+
+    # 再次初始化不再补列，也不重建统计
+    app = make_app(tmp_path)
+    output = capsys.readouterr().out
+    assert '新增列' not in output
+    assert '已根据销售记录生成' not in output
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,113 @@
+import re
+
+import pytest
+from sqlalchemy import update
+
+import catalog
+from conftest import csrf_token, make_app, login
+from models import db, CatalogVersion, Category, Product
+
+
+@pytest.fixture
+def product_id(app):
+    with app.app_context():
+        category = Category.query.filter_by(name='未分类').one()
+        product = Product(name='苹果', price=2, stock=37, category=category)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+def test_sale_does_not_bump_catalog_version(app, client, product_id):
+    with app.app_context():
+        before = catalog.current_version()
+    client.post(f'/sales/operate/{product_id}', data={'quantity': '1', 'submit_out': '1'})
+    with app.app_context():
+        # 销售不锁目录版本号那一行
+        assert catalog.current_version() == before
+        product = db.session.get(Product, product_id)
+        assert product.stock == 36
+        product.price = 3
+        db.session.commit()
+        # 目录字段变化仍递增版本号
+        assert catalog.current_version() == before + 1
+
+
+@pytest.mark.parametrize('url', ['/products', '/sales', '/sales-simple'])
+def test_stock_pages_reflect_sales(client, product_id, url):
+    first = client.get(url)
+    assert '37' in first.data.decode()
+    client.post(f'/sales/operate/{product_id}', data={'quantity': '4', 'submit_out': '1'})
+    # 条件GET 不能返回旧库存的 304，缓存的片段也要重新渲染
+    second = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert '33' in second.data.decode()
+
+
+def cells(page, label):
+    """列表页中某一列的全部单元格内容"""
+    return re.findall(rf'<td data-label="{label}"[^>]*>([^<]*)</td>', page)
+
+
+@pytest.fixture
+def fruit_id(app, product_id):
+    """苹果所在的分类"""
+    with app.app_context():
+        category = Category(name='水果')
+        db.session.add(category)
+        db.session.flush()
+        db.session.get(Product, product_id).category = category
+        db.session.commit()
+        return category.id
+
+
+def test_category_rename_is_rendered(client, fruit_id):
+    # 先渲染一次，让分类缓存和商品行片段都有内容
+    assert cells(client.get('/products').data.decode(), '分类') == ['水果']
+    assert '水果' in client.get('/sales').data.decode()
+    client.post(f'/categories/edit/{fruit_id}', data={'name': '鲜果', 'csrf_token': csrf_token(client)})
+    assert cells(client.get('/products').data.decode(), '分类') == ['鲜果']
+    page = client.get('/sales').data.decode()
+    assert '鲜果' in page and '水果' not in page
+    page = client.get('/categories').data.decode()
+    assert '鲜果' in page and '水果' not in page
+
+
+def test_category_delete_is_rendered(app, client):
+    with app.app_context():
+        db.session.add(Category(name='临时分类'))
+        db.session.commit()
+        category_id = Category.query.filter_by(name='临时分类').one().id
+    assert '临时分类' in client.get('/categories').data.decode()
+    assert '临时分类' in client.get('/products').data.decode()
+    client.post(f'/categories/delete/{category_id}', data={'csrf_token': csrf_token(client)})
+    assert '临时分类' not in client.get('/categories').data.decode()
+    assert '临时分类' not in client.get('/products').data.decode()
+
+
+def test_product_edit_is_rendered(client, product_id, fruit_id):
+    page = client.get('/products').data.decode()
+    assert (cells(page, '单价'), cells(page, '库存')) == (['2.00'], ['37'])
+    client.post(f'/products/edit/{product_id}', data={
+        'name': '苹果', 'price': '5.5', 'stock': '91', 'category': str(fruit_id),
+    })
+    page = client.get('/products').data.decode()
+    assert (cells(page, '单价'), cells(page, '库存')) == (['5.50'], ['91'])
+    assert '91' in client.get('/sales').data.decode()
+
+
+def test_category_change_from_another_process_is_seen(tmp_path):
+    app = make_app(tmp_path, CATEGORY_CACHE_TTL=0)
+    client = app.test_client()
+    login(client, app)
+    assert '未分类' in client.get('/categories').data.decode()
+    # 其他进程改名：只递增数据库中的分类版本号，本进程的缓存不会被直接失效
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(update(Category).where(Category.name == '未分类').values(name='其他'))
+            conn.execute(update(CatalogVersion).where(CatalogVersion.id == catalog.CATEGORY_ROW)
+                         .values(value=CatalogVersion.value + 1))
+    page = client.get('/categories').data.decode()
+    assert '其他' in page and '未分类' not in page
+    with app.app_context():
+        db.engine.dispose()
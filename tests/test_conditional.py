@@ -0,0 +1,79 @@
+import gzip
+
+import pytest
+from sqlalchemy import select
+
+import compression
+import views
+from conftest import add_product
+from models import db, Sale
+
+
+@pytest.fixture
+def product_id(app):
+    return add_product(app)
+
+
+def test_matching_etag_returns_304_without_rendering(client, product_id, monkeypatch):
+    first = client.get('/')
+    assert first.status_code == 200
+    rendered = []
+    monkeypatch.setattr(views, 'render_template', lambda *a, **kw: rendered.append(a) or '')
+    second = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert rendered == []
+
+
+def dashboard_etag(client):
+    # 有待显示的 flash 消息时页面不带 ETag，先把消息显示掉
+    client.get('/')
+    return client.get('/').headers['ETag']
+
+
+def test_sale_and_reversal_change_etag(app, client, product_id):
+    etags = [dashboard_etag(client)]
+    client.post(f'/sales/operate/{product_id}', data={'quantity': '1', 'submit_out': '1'})
+    etags.append(dashboard_etag(client))
+    with app.app_context():
+        sale_id = db.session.scalar(select(Sale.id))
+    client.post(f'/sales/reverse/{sale_id}')
+    client.get('/')
+    resp = client.get('/', headers={'If-None-Match': etags[-1]})
+    assert resp.status_code == 200
+    etags.append(resp.headers['ETag'])
+    assert len(set(etags)) == 3
+
+
+def test_gzip_negotiation(client, product_id):
+    resp = client.get('/products', headers={'Accept-Encoding': 'br;q=0, gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    assert '苹果' in gzip.decompress(resp.data).decode()
+
+
+@pytest.mark.skipif(compression.brotli is None, reason='未安装 Brotli')
+def test_brotli_preferred(client, product_id):
+    resp = client.get('/products', headers={'Accept-Encoding': 'gzip, br'})
+    assert resp.headers['Content-Encoding'] == 'br'
+    assert '苹果' in compression.brotli.decompress(resp.data).decode()
+
+
+def test_brotli_unavailable_falls_back_to_gzip(client, product_id, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    resp = client.get('/products', headers={'Accept-Encoding': 'br, gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.parametrize('encoding', ['identity', '', 'gzip;q=0'])
+def test_identity_is_not_compressed(client, product_id, encoding):
+    resp = client.get('/products', headers={'Accept-Encoding': encoding})
+    assert 'Content-Encoding' not in resp.headers
+    assert '苹果' in resp.data.decode()
+
+
+def test_small_response_is_not_compressed(app, client, product_id):
+    resp = client.get(f'/api/sales/detail/{product_id}/daily', headers={'Accept-Encoding': 'gzip'})
+    assert len(resp.data) < app.config['COMPRESS_MIN_SIZE']
+    assert 'Content-Encoding' not in resp.headers
+    assert resp.get_json()['success']
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask_login import login_user
+from sqlalchemy import func, insert, select
+
+import idempotency
+from conftest import add_product, add_user, login
+from models import db, IdempotencyKey, Product, Sale, User
+
+
+@pytest.fixture
+def product_id(app):
+    return add_product(app)
+
+
+def sell(client, product_id, key):
+    return client.post(f'/sales/operate/{product_id}',
+                       data={'quantity': '1', 'submit_out': '1', idempotency.FIELD: key})
+
+
+def sale_count(app):
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(Sale))
+
+
+def stock(app, product_id):
+    with app.app_context():
+        return db.session.get(Product, product_id).stock
+
+
+def test_duplicate_post_is_applied_once(app, client, product_id):
+    first = sell(client, product_id, 'k1')
+    second = sell(client, product_id, 'k1')
+    assert first.status_code == second.status_code == 302
+    assert second.headers['Location'] == first.headers['Location']
+    assert sale_count(app) == 1
+    assert stock(app, product_id) == 9
+
+
+def test_duplicate_reversal_is_applied_once(app, client, product_id):
+    sell(client, product_id, 'k1')
+    with app.app_context():
+        sale_id = db.session.scalar(select(Sale.id))
+    for _ in range(2):
+        client.post(f'/sales/reverse/{sale_id}', data={idempotency.FIELD: 'k2'})
+    assert stock(app, product_id) == 10
+
+
+def test_key_from_another_user_is_conflict(app, client, product_id):
+    sell(client, product_id, 'k1')
+    add_user(app, 'bob')
+    other = app.test_client()
+    login(other, app, 'bob')
+    assert sell(other, product_id, 'k1').status_code == 409
+    assert sale_count(app) == 1
+
+
+def test_expired_key_is_purged_and_reusable(app, client, product_id, monkeypatch):
+    sell(client, product_id, 'k1')
+    sell(client, product_id, 'k2')
+    expired = datetime.now() - timedelta(seconds=app.config['IDEMPOTENCY_TTL'] + 1)
+    with app.app_context():
+        IdempotencyKey.query.update({'created_at': expired})
+        db.session.commit()
+    # 过期令牌每 PURGE_INTERVAL 秒才清理一次
+    monkeypatch.setattr(idempotency, '_next_purge', datetime.min)
+    # 过期的 k1 按新请求处理，k2 在写入时被清理
+    sell(client, product_id, 'k1')
+    assert sale_count(app) == 3
+    with app.app_context():
+        assert db.session.scalars(select(IdempotencyKey.key)).all() == ['k1']
+
+
+def test_concurrent_duplicate_replays_instead_of_raising(app, product_id):
+    with app.test_request_context():
+        admin = User.query.filter_by(username='admin').one()
+        login_user(admin)
+        # 另一个请求在本次 replay 检查之后抢先提交了同一令牌
+        with db.engine.begin() as conn:
+            conn.execute(insert(IdempotencyKey).values(
+                key='k1', user_id=admin.id, location='/first', message='销售成功',
+                category='message', created_at=datetime.now()))
+        db.session.get(Product, product_id).stock -= 1
+        response = idempotency.commit('k1', '/second', '销售成功')
+        assert response.status_code == 302
+        assert response.headers['Location'] == '/first'
+    assert stock(app, product_id) == 10
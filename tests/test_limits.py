@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+import audit
+from conftest import add_product, add_user, login
+from models import db, Product
+
+
+@pytest.fixture
+def full_slots(app):
+    """重型请求名额已被占满"""
+    slots = app.extensions['heavy_slots'] = threading.BoundedSemaphore(1)
+    slots.acquire()
+    yield
+    slots.release()
+
+
+def test_heavy_view_is_rejected_when_slots_are_full(app, client, full_slots):
+    resp = client.get('/export')
+    assert resp.status_code == 503
+    assert resp.headers['Retry-After'] == str(app.config['HEAVY_RETRY_AFTER'])
+    resp = client.get('/logs?page=51')
+    assert resp.status_code == 503
+
+
+def test_light_request_on_heavy_view_is_not_limited(client, full_slots):
+    assert client.get('/logs').status_code == 200
+    assert client.get('/products/import').status_code == 200
+
+
+def test_sales_are_never_limited(app, client, full_slots):
+    product_id = add_product(app)
+    resp = client.post(f'/sales/operate/{product_id}', data={'quantity': '2', 'submit_out': '1'})
+    assert resp.status_code == 302
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 8
+
+
+def test_non_admin_is_rejected_before_heavy_slot(app, monkeypatch, full_slots):
+    add_user(app, 'bob')
+    client = app.test_client()
+    login(client, app, 'bob')
+    flushed = []
+    monkeypatch.setattr(audit.audit_queue, 'flush', lambda: flushed.append(1))
+    assert client.get('/logs?page=51').status_code == 403
+    assert client.post('/products/import').status_code == 403
+    # 名额已满时也是 403 而不是 503，且不会触发日志落库
+    assert flushed == []
@@ -0,0 +1,53 @@
+from sqlalchemy import insert, select
+
+from conftest import count_statements, login, make_app
+from models import db, User, Category, Product, Sale, Log
+
+PAGES = ('/', '/products', '/sales', '/sales-simple', '/logs', '/categories')
+
+
+def seed(app, size):
+    with app.app_context():
+        admin_id = db.session.scalar(select(User.id).where(User.username == 'admin'))
+        db.session.execute(insert(Category), [{'name': f'分类{i}'} for i in range(size)])
+        category_ids = db.session.scalars(select(Category.id).where(Category.name.like('分类%'))).all()
+        db.session.execute(insert(Product), [
+            {'name': f'商品{i}', 'price': 1, 'stock': 10, 'version': 1, 'category_id': category_ids[i]}
+            for i in range(size)
+        ])
+        product_ids = db.session.scalars(select(Product.id)).all()
+        db.session.execute(insert(Sale), [
+            {'product_id': pid, 'quantity': 1, 'type': 'out', 'amount': 1, 'user_id': admin_id, 'is_reversed': False}
+            for pid in product_ids
+        ])
+        sale_ids = db.session.scalars(select(Sale.id)).all()
+        db.session.execute(insert(Log), [{'user_id': admin_id, 'action': '销售', 'sale_id': sid} for sid in sale_ids])
+        db.session.commit()
+
+
+def page_counts(tmp_path, size):
+    tmp_path.mkdir()
+    # 片段缓存会跳过模板中的属性访问，测试时关闭
+    app = make_app(tmp_path, RAISE_ON_LAZY_LOAD=True, FRAGMENT_CACHE_BACKEND='null', PER_PAGE=50)
+    seed(app, size)
+    client = app.test_client()
+    login(client, app)
+    counts = {}
+    for url in PAGES:
+        # 先请求一次，让分类缓存等进程内缓存就绪
+        client.get(url)
+        with count_statements(app) as statements:
+            resp = client.get(url)
+        # 未预加载的关系被访问时 raiseload 会报错，页面返回 500
+        assert resp.status_code == 200, url
+        counts[url] = len(statements)
+    with app.app_context():
+        db.engine.dispose()
+    return counts
+
+
+def test_list_pages_have_no_lazy_loads(tmp_path):
+    small = page_counts(tmp_path / 'small', 3)
+    large = page_counts(tmp_path / 'large', 15)
+    # 查询数与列表行数无关（没有逐行懒加载）
+    assert small == large
@@ -0,0 +1,78 @@
+import shutil
+import time
+
+import pytest
+from sqlalchemy import text
+
+import routing
+from conftest import add_product, login, make_app
+from models import db
+
+
+def sell(client, product_id, quantity):
+    resp = client.post(f'/sales/operate/{product_id}', data={'quantity': str(quantity), 'submit_out': '1'})
+    assert resp.status_code == 302
+
+
+def total_qty(client, product_id):
+    resp = client.get(f'/api/sales/detail/{product_id}/daily')
+    assert resp.status_code == 200
+    return resp.get_json()['total_qty']
+
+
+@pytest.fixture(autouse=True)
+def replica_up(monkeypatch):
+    # 副本故障标记是进程级的
+    monkeypatch.setattr(routing, '_replica_down_until', 0.0)
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """主库卖出 2 件后复制出副本，之后主库再卖出 5 件，副本停留在旧数据"""
+    app = make_app(tmp_path, SQLALCHEMY_REPLICA_URI=f"sqlite:///{tmp_path / 'replica.db'}")
+    product_id = add_product(app)
+    writer = app.test_client()
+    login(writer, app)
+    sell(writer, product_id, 2)
+    with app.app_context():
+        # WAL 模式下未写回主库文件的数据不会随文件复制
+        with db.engine.connect() as conn:
+            conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        db.engine.dispose()
+    shutil.copy(tmp_path / 'sales.db', tmp_path / 'replica.db')
+    sell(writer, product_id, 5)
+    yield app, product_id
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_read_replica_view_reads_replica(replica_app):
+    app, product_id = replica_app
+    client = app.test_client()
+    login(client, app)
+    assert total_qty(client, product_id) == 2
+
+
+def test_request_after_write_is_pinned_to_primary(replica_app):
+    app, product_id = replica_app
+    client = app.test_client()
+    login(client, app)
+    sell(client, product_id, 1)
+    with client.session_transaction() as sess:
+        assert sess[routing.PIN_SESSION_KEY] > time.time()
+    assert total_qty(client, product_id) == 8
+
+
+def test_missing_replica_falls_back_to_primary(tmp_path):
+    app = make_app(tmp_path, SQLALCHEMY_REPLICA_URI=f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    product_id = add_product(app)
+    writer = app.test_client()
+    login(writer, app)
+    sell(writer, product_id, 3)
+    client = app.test_client()
+    login(client, app)
+    assert total_qty(client, product_id) == 3
+    assert routing._replica_down_until > time.monotonic()
+    with app.app_context():
+        db.engine.dispose()
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import func, select
+
+from models import db, Product, ProductStats, Sale, User
+
+
+@pytest.fixture
+def product_id(app):
+    with app.app_context():
+        product = Product(name='苹果', price=2, stock=10)
+        db.session.add(product)
+        db.session.commit()
+        return product.id
+
+
+@pytest.mark.parametrize('quantity', ['-5', '0', 'abc'])
+@pytest.mark.parametrize('action', ['submit_out', 'submit_in'])
+def test_invalid_quantity_is_rejected(app, client, product_id, quantity, action):
+    resp = client.post(f'/sales/operate/{product_id}', data={'quantity': quantity, action: '1'})
+    assert resp.status_code == 302
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 10
+        assert db.session.scalar(select(func.count()).select_from(Sale)) == 0
+        assert db.session.get(ProductStats, product_id) is None
+
+
+def test_sale_updates_stock_and_stats(app, client, product_id):
+    client.post(f'/sales/operate/{product_id}', data={'quantity': '3', 'submit_out': '1'})
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 7
+        stats = db.session.get(ProductStats, product_id)
+        assert (stats.out_qty, float(stats.out_amount)) == (3, 6.0)
+
+
+def test_sync_rejects_other_users_queue(app, client, product_id):
+    with app.app_context():
+        admin_id = db.session.scalar(select(User.id).where(User.username == 'admin'))
+    line = {'id': 'k1', 'product_id': product_id, 'type': 'out', 'quantity': 1}
+    resp = client.post('/api/sales/sync', json={'sales': [
+        dict(line, user_id=admin_id + 1),
+        dict(line, id='k2', user_id=admin_id),
+    ]})
+    assert [r['status'] for r in resp.get_json()['results']] == ['wrong_user', 'ok']
+    with app.app_context():
+        assert db.session.get(Product, product_id).stock == 9
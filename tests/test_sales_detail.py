@@ -0,0 +1,90 @@
+import random
+import re
+from datetime import datetime
+from html import unescape
+
+import pytest
+from sqlalchemy import insert
+
+from conftest import add_product
+from models import db, Sale
+from views import DETAIL_PAGE_SIZE
+
+DAY1 = datetime(2026, 3, 1, 10, 0)
+DAY2_MORNING = datetime(2026, 3, 2, 9, 0)
+DAY2_NOON = datetime(2026, 3, 2, 12, 0)
+# 同一时刻的销售跨越分页边界
+TIMES = [DAY1] * 55 + [DAY2_MORNING] * 45 + [DAY2_NOON] * 25
+
+
+@pytest.fixture
+def product_id(app):
+    product_id = add_product(app, stock=10 ** 6)
+    # 以数量作为每笔销售的标识；ID 顺序与时间顺序无关
+    rows = [{'product_id': product_id, 'quantity': i + 1, 'type': 'out', 'amount': 2 * (i + 1),
+             'created_at': ts, 'is_reversed': False} for i, ts in enumerate(TIMES)]
+    random.Random(0).shuffle(rows)
+    rows += [
+        dict(rows[0], quantity=9001, is_reversed=True),
+        dict(rows[0], quantity=9002, type='in'),
+    ]
+    with app.app_context():
+        db.session.execute(insert(Sale), rows)
+        db.session.commit()
+    return product_id
+
+
+def fetch_pages(client, url):
+    """沿“更早”链接翻到最后一页，返回每页的销售数量列"""
+    pages = []
+    while url:
+        page = client.get(url).data.decode()
+        pages.append([int(q) for q in re.findall(r'<tr>\s*<td>(\d+)</td>', page)])
+        match = re.search(r'href="([^"]+)">更早</a>', page)
+        url = unescape(match.group(1)) if match else None
+    return pages
+
+
+def test_cursor_pages_have_no_gaps_or_duplicates(client, product_id):
+    pages = fetch_pages(client, f'/sales/detail/{product_id}')
+    assert [len(p) for p in pages] == [DETAIL_PAGE_SIZE, DETAIL_PAGE_SIZE, len(TIMES) - 2 * DETAIL_PAGE_SIZE]
+    quantities = [q for page in pages for q in page]
+    assert sorted(quantities) == list(range(1, len(TIMES) + 1))
+    times = [TIMES[q - 1] for q in quantities]
+    assert times == sorted(times, reverse=True)
+
+
+def test_cursor_respects_date_range(client, product_id):
+    pages = fetch_pages(client, f'/sales/detail/{product_id}?start_date=2026-03-02&end_date=2026-03-02')
+    quantities = [q for page in pages for q in page]
+    assert sorted(quantities) == list(range(56, len(TIMES) + 1))
+
+
+@pytest.mark.parametrize('query', [
+    'before=garbage', 'before=2026-03-01T10:00:00_abc', 'before=_', 'before=notadate_5',
+])
+def test_malformed_cursor_returns_first_page(client, product_id, query):
+    first = fetch_pages(client, f'/sales/detail/{product_id}')[0]
+    resp = client.get(f'/sales/detail/{product_id}?{query}')
+    assert resp.status_code == 200
+    assert [int(q) for q in re.findall(r'<tr>\s*<td>(\d+)</td>', resp.data.decode())] == first
+
+
+@pytest.mark.parametrize('query', ['start_date=2026-13-45', 'end_date=yesterday', 'start_date=&end_date='])
+def test_malformed_date_is_ignored(client, product_id, query):
+    assert client.get(f'/sales/detail/{product_id}?{query}').status_code == 200
+    data = client.get(f'/api/sales/detail/{product_id}/daily?{query}').get_json()
+    assert data['total_qty'] == sum(range(1, len(TIMES) + 1))
+
+
+def test_daily_series_totals(client, product_id):
+    data = client.get(f'/api/sales/detail/{product_id}/daily').get_json()
+    day1 = sum(range(1, 56))
+    day2 = sum(range(56, len(TIMES) + 1))
+    assert data['days'] == ['2026-03-01', '2026-03-02']
+    assert data['qty'] == [day1, day2]
+    assert data['amount'] == [2.0 * day1, 2.0 * day2]
+    assert (data['total_qty'], data['total_amount']) == (day1 + day2, 2.0 * (day1 + day2))
+
+    data = client.get(f'/api/sales/detail/{product_id}/daily?start_date=2026-03-02&end_date=2026-03-02').get_json()
+    assert (data['days'], data['total_qty']) == (['2026-03-02'], day2)
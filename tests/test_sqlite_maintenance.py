@@ -0,0 +1,22 @@
+import threading
+
+from conftest import make_app
+from models import db
+
+
+def maintenance_threads():
+    return [t for t in threading.enumerate() if t.name == 'sqlite-maintenance']
+
+
+def test_maintenance_starts_on_first_request(tmp_path):
+    before = len(maintenance_threads())
+    app = make_app(tmp_path, TESTING=False, ASSETS_REQUIRE_VENDOR=False, SQLITE_OPTIMIZE_INTERVAL=3600)
+    # create_app 与 flask 命令不启动维护线程
+    assert len(maintenance_threads()) == before
+    client = app.test_client()
+    client.get('/login')
+    client.get('/login')
+    assert len(maintenance_threads()) == before + 1
+    app.extensions['sqlite_maintenance'].set()
+    with app.app_context():
+        db.engine.dispose()
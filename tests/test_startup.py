@@ -0,0 +1,20 @@
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# 只在导入、导出、验证码中用到，启动时不应加载（见 benchmarks/startup.py）
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'PIL')
+
+CHILD = """
+import json, sys
+import app
+app.create_app(config={'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'ASSETS_REQUIRE_VENDOR': False})
+print(json.dumps([m for m in %r if m in sys.modules]))
+""" % (HEAVY_MODULES,)
+
+
+def test_create_app_does_not_import_heavy_modules():
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -1,12 +1,29 @@
-import pandas as pd
-from models import db, Product, Category
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from models import db, Product, Category, Log, ProductStats, Sale
+from backends import get_backend
+import catalog
+
+# 批量导入时 IN 查询/多行 INSERT 每批的行数
+IMPORT_CHUNK_SIZE = 500
+# 批量删除时每条 IN (...) 语句包含的ID数
+DELETE_CHUNK_SIZE = 500
+
+def chunked(items, size):
+    """按固定大小切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
 def import_products_csv(file):
-    df = pd.read_csv(file)
+    # pandas 只在导入时用到，按需加载以加快进程启动、减少常驻内存
+    import pandas as pd
+
+    # 条码按文本读取，避免长数字被转成浮点数
+    df = pd.read_csv(file, dtype={'条码': str, '条码(可选)': str})
     # 1. 检查列名是否完全匹配（忽略空格和大小写，但严格匹配文字）
     required_columns = ['商品名', '单价', '库存', '分类']
-    # 清洗列名（去除前后空格）
-    df.columns = [col.strip() for col in df.columns]
+    # 清洗列名（去除前后空格，以及模板中可选列的“(可选)”后缀）
+    df.columns = [col.strip().removesuffix('(可选)').strip() for col in df.columns]
     missing_columns = [col for col in required_columns if col not in df.columns]
     if missing_columns:
         print(f"缺少必填列：{missing_columns}")
@@ -14,6 +31,8 @@ def import_products_csv(file):
     
     # 记录成功导入的商品数量
     success_count = 0
+    # 先校验所有行，再批量写入分类和商品
+    parsed_rows = []
     
     for idx, row in df.iterrows():
         row_num = idx + 1
@@ -45,43 +64,87 @@ def import_products_csv(file):
             print(f"第{row_num}行：单价或库存格式错误（单价：{price_str}，库存：{stock_str}）")
             continue
         
-        # 5. 处理分类
-        category = Category.query.filter_by(name=category_name).first()
-        if not category:
-            # 如果分类不存在，创建新分类
-            category = Category(name=category_name)
-            db.session.add(category)
-            db.session.flush()  # 立即获取新分类的ID
-        
         # 6. 处理图片链接（可选）
         image_link = str(row.get('图片链接', '')).strip() if '图片链接' in df.columns else ''
+        if image_link == 'nan':
+            image_link = ''
         
-        # 7. 创建或更新商品
-        # 检查是否已存在同名商品
-        existing_product = Product.query.filter_by(name=prod_name).first()
-        if existing_product:
-            # 更新现有商品
-            existing_product.price = price
-            existing_product.stock = stock
-            existing_product.category_id = category.id
-            if image_link:
-                existing_product.image = image_link
-            print(f"第{row_num}行：更新商品 '{prod_name}'")
-        else:
-            # 创建新商品
-            product = Product(
-                name=prod_name,
-                price=price,
-                stock=stock,
-                category_id=category.id,
-                image=image_link if image_link else None
-            )
-            db.session.add(product)
-            print(f"第{row_num}行：创建商品 '{prod_name}'")
+        # 条码/SKU（可选）
+        barcode = str(row.get('条码', '')).strip() if '条码' in df.columns else ''
+        if barcode == 'nan':
+            barcode = ''
         
-        success_count += 1
+        parsed_rows.append((row_num, prod_name, price, stock, category_name, image_link, barcode or None))
     
+    backend = get_backend()
+    # 大批量导入在PostgreSQL上走 COPY 快速路径
+    if hasattr(backend, 'merge_products') and len(parsed_rows) >= current_app.config['PG_COPY_IMPORT_MIN_ROWS']:
+        return import_products_bulk(backend, parsed_rows)
+
     try:
+        # 5. 处理分类：一条 upsert 语句补齐缺失分类，再一次查询取回ID
+        category_names = list(dict.fromkeys(r[4] for r in parsed_rows))
+        category_ids = {}
+        for chunk in chunked(category_names, IMPORT_CHUNK_SIZE):
+            db.session.execute(backend.upsert(Category, [{'name': n} for n in chunk], ['name']))
+            category_ids.update(db.session.query(Category.name, Category.id).filter(Category.name.in_(chunk)).all())
+        # upsert 绕过了 ORM，需显式标记分类已变更，提交后分类缓存失效
+        if category_names:
+            catalog.mark_categories_changed(db.session.connection())
+        
+        # 7. 创建或更新商品：有条码时按条码匹配，否则按商品名匹配，均批量查询
+        product_names = list(dict.fromkeys(r[1] for r in parsed_rows))
+        existing_products = {}
+        for chunk in chunked(product_names, IMPORT_CHUNK_SIZE):
+            for product in Product.query.filter(Product.name.in_(chunk)).order_by(Product.id):
+                existing_products.setdefault(product.name, product)
+        barcodes = list(dict.fromkeys(r[6] for r in parsed_rows if r[6]))
+        products_by_code = {}
+        for chunk in chunked(barcodes, IMPORT_CHUNK_SIZE):
+            for product in Product.query.filter(Product.barcode.in_(chunk)):
+                products_by_code[product.barcode] = product
+        
+        for row_num, prod_name, price, stock, category_name, image_link, barcode in parsed_rows:
+            if barcode:
+                existing_product = products_by_code.get(barcode)
+                if existing_product is None:
+                    existing_product = existing_products.get(prod_name)
+                    # 同名商品已有其他条码时视为不同商品
+                    if existing_product is not None and existing_product.barcode:
+                        existing_product = None
+            else:
+                existing_product = existing_products.get(prod_name)
+            if existing_product:
+                # 更新现有商品
+                if barcode:
+                    existing_product.name = prod_name
+                    existing_product.barcode = barcode
+                    products_by_code[barcode] = existing_product
+                existing_product.price = price
+                existing_product.stock = stock
+                existing_product.category_id = category_ids[category_name]
+                if image_link:
+                    existing_product.image = image_link
+                print(f"第{row_num}行：更新商品 '{prod_name}'")
+            else:
+                # 创建新商品
+                product = Product(
+                    name=prod_name,
+                    barcode=barcode,
+                    price=price,
+                    stock=stock,
+                    category_id=category_ids[category_name],
+                    image=image_link if image_link else None
+                )
+                db.session.add(product)
+                # 同一文件中后续同名行更新这条新商品
+                existing_products[prod_name] = product
+                if barcode:
+                    products_by_code[barcode] = product
+                print(f"第{row_num}行：创建商品 '{prod_name}'")
+            
+            success_count += 1
+        
         db.session.commit()
         print(f"成功导入/更新 {success_count} 个商品")
         return True
@@ -89,3 +152,130 @@ def import_products_csv(file):
         db.session.rollback()
         print(f"提交到数据库时出错: {e}")
         return False
+
+def resolve_import_targets(conn, parsed_rows):
+    """
+    按与 import_products_csv 逐行处理相同的规则匹配已有商品（有条码时按条码，否则按商品名），
+    并合并文件内指向同一商品的行，返回每个目标商品的最终值（id 为 None 表示新建）。
+    只查询 id/name/barcode 三列，不加载ORM对象。
+    """
+    product = Product.__table__
+    loaded = {}
+
+    def target_for(pid, name, barcode):
+        return loaded.setdefault(pid, {'id': pid, 'name': name, 'barcode': barcode, 'image': None})
+
+    by_name = {}
+    for chunk in chunked(list(dict.fromkeys(r[1] for r in parsed_rows)), IMPORT_CHUNK_SIZE):
+        query = select(product.c.id, product.c.name, product.c.barcode)\
+            .where(product.c.name.in_(chunk)).order_by(product.c.id)
+        for pid, name, barcode in conn.execute(query):
+            by_name.setdefault(name, target_for(pid, name, barcode))
+    by_code = {}
+    for chunk in chunked(list(dict.fromkeys(r[6] for r in parsed_rows if r[6])), IMPORT_CHUNK_SIZE):
+        query = select(product.c.id, product.c.name, product.c.barcode).where(product.c.barcode.in_(chunk))
+        for pid, name, barcode in conn.execute(query):
+            by_code[barcode] = target_for(pid, name, barcode)
+
+    touched = {}
+    for row_num, prod_name, price, stock, category_name, image_link, barcode in parsed_rows:
+        if barcode:
+            target = by_code.get(barcode)
+            if target is None:
+                target = by_name.get(prod_name)
+                # 同名商品已有其他条码时视为不同商品
+                if target is not None and target['barcode']:
+                    target = None
+        else:
+            target = by_name.get(prod_name)
+        if target is None:
+            target = {'id': None, 'name': prod_name, 'barcode': barcode, 'image': None}
+            # 同一文件中后续同名行更新这条新商品
+            by_name[prod_name] = target
+            if barcode:
+                by_code[barcode] = target
+        elif barcode:
+            target['name'] = prod_name
+            target['barcode'] = barcode
+            by_code[barcode] = target
+        target.update(price=price, stock=stock, category=category_name)
+        if image_link:
+            target['image'] = image_link
+        touched[id(target)] = target
+    return list(touched.values())
+
+def import_products_bulk(backend, parsed_rows):
+    """
+    大批量导入：在应用内完成匹配，结果经 COPY 写入临时表，再由数据库一次补齐分类、
+    合并商品。绕过了 ORM，目录与分类版本号在此显式递增。
+    """
+    try:
+        conn = db.session.connection()
+        targets = resolve_import_targets(conn, parsed_rows)
+        version = catalog.bump_version(conn)
+        backend.merge_products(conn, targets, version)
+        catalog.mark_categories_changed(conn)
+        db.session.commit()
+        print(f"成功导入/更新 {len(parsed_rows)} 个商品（COPY 合并 {len(targets)} 条）")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        print(f"提交到数据库时出错: {e}")
+        return False
+
+
+def delete_products(product_ids):
+    """
+    按集合批量删除商品及其销售记录，返回被删除的商品名（不提交事务）。
+    每批 DELETE_CHUNK_SIZE 个ID，每批固定 4 条语句：
+    日志解除对销售记录的引用、删除销售记录、删除统计、删除商品（RETURNING 商品名）。
+    """
+    conn = db.session.connection()
+    returning = conn.dialect.delete_returning
+    deleted_ids, deleted_names = [], []
+    for chunk in chunked(list(dict.fromkeys(product_ids)), DELETE_CHUNK_SIZE):
+        sale_ids = select(Sale.id).where(Sale.product_id.in_(chunk))
+        conn.execute(update(Log.__table__).where(Log.__table__.c.sale_id.in_(sale_ids)).values(sale_id=None))
+        conn.execute(delete(Sale.__table__).where(Sale.__table__.c.product_id.in_(chunk)))
+        conn.execute(delete(ProductStats.__table__).where(ProductStats.__table__.c.product_id.in_(chunk)))
+        stmt = delete(Product.__table__).where(Product.__table__.c.id.in_(chunk))
+        if returning:
+            rows = conn.execute(stmt.returning(Product.__table__.c.id, Product.__table__.c.name)).all()
+        else:
+            # MySQL 不支持 DELETE ... RETURNING，先查再删
+            rows = conn.execute(select(Product.id, Product.name).where(Product.id.in_(chunk))).all()
+            conn.execute(stmt)
+        deleted_ids += [row[0] for row in rows]
+        deleted_names += [row[1] for row in rows]
+    if deleted_ids:
+        catalog.record_deleted(conn, deleted_ids)
+        catalog.mark_categories_changed(conn)
+    # 会话中可能已加载这些商品，使其失效以免后续读到已删除的对象
+    db.session.expire_all()
+    return deleted_names
+
+
+def delete_categories(category_ids):
+    """
+    批量删除没有商品的分类（不提交事务）。
+    一次分组计数找出仍有商品的分类，返回 (已删除的分类名, [(仍被使用的分类名, 商品数)])。
+    """
+    conn = db.session.connection()
+    deleted_names, in_use = [], []
+    for chunk in chunked(list(dict.fromkeys(category_ids)), DELETE_CHUNK_SIZE):
+        names = dict(conn.execute(select(Category.id, Category.name).where(Category.id.in_(chunk))).all())
+        counts = dict(conn.execute(
+            select(Product.category_id, func.count(Product.id))
+            .where(Product.category_id.in_(list(names)))
+            .group_by(Product.category_id)
+        ).all())
+        deletable = [cid for cid in names if cid not in counts]
+        in_use += [(names[cid], count) for cid, count in counts.items()]
+        if deletable:
+            conn.execute(delete(Category.__table__).where(Category.__table__.c.id.in_(deletable)))
+            deleted_names += [names[cid] for cid in deletable]
+    if deleted_names:
+        catalog.bump_version(conn)
+        catalog.mark_categories_changed(conn)
+    db.session.expire_all()
+    return deleted_names, in_use
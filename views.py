@@ -0,0 +1,1763 @@
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, send_file, send_from_directory, abort
+from flask_wtf.csrf import generate_csrf
+from flask_login import login_user, login_required, logout_user, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.utils import secure_filename
+from forms import *
+from models import db, User, Category, Product, ProductStats, Sale, Log
+from utils import delete_categories, delete_products, import_products_csv
+from backends import get_backend
+from backends.pool import engine_metrics
+from routing import read_replica
+from limits import heavy, statement_timeout
+from audit import audit_queue
+import idempotency
+import catalog
+from catalog import category_cache
+import os
+import hashlib
+import time
+import datetime as dt
+from functools import wraps
+from io import BytesIO
+from sqlalchemy import and_, func, desc, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, raiseload
+from flask import make_response
+import csv
+from io import StringIO
+from urllib.parse import urlparse, parse_qs
+import random
+import string
+from datetime import datetime, timedelta
+from flask import session, jsonify
+import smtplib
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from itsdangerous import URLSafeTimedSerializer
+
+
+bp = Blueprint('main', __name__)
+
+register_attempts = {}
+login_attempts = {}
+
+def is_register_locked(ip_address):
+    """检查IP是否被锁定注册"""
+    if ip_address in register_attempts:
+        attempts, lock_time = register_attempts[ip_address]
+        if lock_time and datetime.now() < lock_time:
+            return True
+    return False
+
+def record_register_attempt(ip_address):
+    """记录注册尝试"""
+    if ip_address not in register_attempts:
+        register_attempts[ip_address] = [0, None]
+    
+    attempts, lock_time = register_attempts[ip_address]
+    
+    # 如果还在锁定期内，直接返回
+    if lock_time and datetime.now() < lock_time:
+        return
+    
+    # 增加尝试计数
+    attempts += 1
+    register_attempts[ip_address][0] = attempts
+    
+    # 如果1小时内尝试注册超过10次，锁定1小时
+    if attempts >= 10:
+        lock_time = datetime.now() + timedelta(hours=1)
+        register_attempts[ip_address] = [attempts, lock_time]
+
+def generate_reset_token(email):
+    """生成密码重置令牌"""
+    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+    return serializer.dumps(email, salt=current_app.config['SECURITY_PASSWORD_SALT'])
+
+def verify_reset_token(token, expiration=3600):
+    """验证密码重置令牌"""
+    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+    try:
+        email = serializer.loads(
+            token,
+            salt=current_app.config['SECURITY_PASSWORD_SALT'],
+            max_age=expiration
+        )
+    except:
+        return None
+    return email
+
+def send_reset_email(user):
+    """发送密码重置邮件"""
+    token = generate_reset_token(user.email)
+    
+    # 构建重置链接
+    reset_url = url_for('main.reset_password', token=token, _external=True)
+    
+    # 邮件内容
+    subject = f"{current_app.config['APP_TITLE']} - 密码重置请求"
+    
+    html_content = f"""
+    <html>
+    <body>
+        <h2>密码重置请求</h2>
+        <p>您好 {user.username},</p>
+        <p>我们收到了您重置密码的请求。请点击下面的链接来重置您的密码：</p>
+        <p><a href="{reset_url}" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">重置密码</a></p>
+        <p>或者复制以下链接到浏览器：</p>
+        <p>{reset_url}</p>
+        <p>如果您没有请求重置密码，请忽略此邮件。</p>
+        <p>此链接将在1小时后过期。</p>
+        <br>
+        <p>祝好,<br>{current_app.config['APP_TITLE']} 团队</p>
+    </body>
+    </html>
+    """
+    
+    text_content = f"""
+    密码重置请求
+    
+    您好 {user.username},
+    
+    我们收到了您重置密码的请求。请访问以下链接来重置您的密码：
+    
+    {reset_url}
+    
+    如果您没有请求重置密码，请忽略此邮件。
+    
+    此链接将在1小时后过期。
+    
+    祝好,
+    {current_app.config['APP_TITLE']} 团队
+    """
+    
+    try:
+        print(f"=== 邮件发送调试信息 ===")
+        print(f"收件人: {user.email}")
+        print(f"SMTP服务器: {current_app.config['SMTP_SERVER']}:{current_app.config['SMTP_PORT']}")
+        print(f"发件人: {current_app.config['FROM_EMAIL']}")
+        print(f"用户名: {current_app.config['SMTP_USERNAME']}")
+        print(f"使用TLS: {current_app.config['SMTP_USE_TLS']}")
+        print(f"端口: {current_app.config['SMTP_PORT']}")
+        
+        # 创建邮件
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = current_app.config['FROM_EMAIL']
+        msg['To'] = user.email
+        
+        # 添加文本和HTML版本
+        part1 = MIMEText(text_content, 'plain', 'utf-8')
+        part2 = MIMEText(html_content, 'html', 'utf-8')
+        msg.attach(part1)
+        msg.attach(part2)
+        
+        # 根据端口选择连接方式
+        if current_app.config['SMTP_PORT'] == 465:
+            print("使用SSL连接 (端口465)...")
+            server = smtplib.SMTP_SSL(current_app.config['SMTP_SERVER'], current_app.config['SMTP_PORT'])
+            server.set_debuglevel(1)  # 开启详细调试
+        else:
+            print(f"使用普通连接 (端口{current_app.config['SMTP_PORT']})...")
+            server = smtplib.SMTP(current_app.config['SMTP_SERVER'], current_app.config['SMTP_PORT'])
+            server.set_debuglevel(1)  # 开启详细调试
+            
+            # 检查服务器能力
+            try:
+                server.ehlo()
+                if server.has_extn('STARTTLS'):
+                    print("服务器支持STARTTLS，正在启用...")
+                    server.starttls()
+                    server.ehlo()  # 重新ehlo
+                else:
+                    print("服务器不支持STARTTLS")
+            except Exception as e:
+                print(f"EHLO/STARTTLS检查失败: {e}")
+        
+        print("正在登录SMTP服务器...")
+        server.login(current_app.config['SMTP_USERNAME'], current_app.config['SMTP_PASSWORD'])
+        
+        print("正在发送邮件...")
+        server.send_message(msg)
+        print("邮件发送成功！")
+        
+        server.quit()
+        return True
+        
+    except smtplib.SMTPConnectError as e:
+        print(f"SMTP连接错误: {e}")
+        print("可能的原因:")
+        print("1. SMTP服务器地址或端口错误")
+        print("2. 防火墙阻止了连接")
+        print("3. 网络连接问题")
+        return False
+    except smtplib.SMTPAuthenticationError as e:
+        print(f"SMTP认证失败: {e}")
+        print("可能的原因:")
+        print("1. 用户名或密码错误")
+        print("2. 需要使用授权码而不是密码")
+        print("3. 邮箱未开启SMTP服务")
+        return False
+    except smtplib.SMTPServerDisconnected as e:
+        print(f"SMTP服务器断开连接: {e}")
+        print("可能的原因:")
+        print("1. 服务器主动断开连接")
+        print("2. 连接超时")
+        print("3. 服务器要求使用SSL/TLS")
+        return False
+    except Exception as e:
+        print(f"发送邮件失败: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+@bp.route('/forgot-password', methods=['GET', 'POST'])
+def forgot_password():
+    """忘记密码页面"""
+    form = ForgotPasswordForm()
+    
+    if form.validate_on_submit():
+        # 检查验证码
+        if 'captcha' not in session or session['captcha'].upper() != form.captcha.data.upper():
+            flash('验证码错误')
+            return render_template('forgot_password.html', form=form)
+        
+        # 查找用户
+        user = User.query.filter_by(email=form.email.data).first()
+        if user and user.is_active:
+            if send_reset_email(user):
+                flash('密码重置邮件已发送，请检查您的邮箱。', 'success')
+                # 清除验证码session
+                session.pop('captcha', None)
+                return redirect(url_for('main.login'))
+            else:
+                flash('发送邮件失败，请稍后重试。', 'error')
+        else:
+            flash('该邮箱未注册或账户未激活。', 'error')
+    
+    return render_template('forgot_password.html', form=form)
+
+@bp.route('/reset-password/<token>', methods=['GET', 'POST'])
+def reset_password(token):
+    """重置密码页面"""
+    # 验证令牌
+    email = verify_reset_token(token)
+    if not email:
+        flash('重置链接无效或已过期。', 'error')
+        return redirect(url_for('main.forgot_password'))
+    
+    # 查找用户
+    user = User.query.filter_by(email=email).first()
+    if not user or not user.is_active:
+        flash('用户不存在或账户未激活。', 'error')
+        return redirect(url_for('main.forgot_password'))
+    
+    form = ResetPasswordForm()
+    
+    if form.validate_on_submit():
+        try:
+            # 更新密码
+            user.password = generate_password_hash(form.password.data)
+            db.session.commit()
+            
+            flash('密码重置成功，请使用新密码登录。', 'success')
+            return redirect(url_for('main.login'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'重置密码失败: {str(e)}', 'error')
+    
+    return render_template('reset_password.html', form=form, token=token)
+
+def get_redirect_url(target, default_params=None):
+    if default_params is None:
+        default_params = {}
+    
+    # 获取来源页面的查询参数
+    referer = request.referrer or ''
+    parsed_url = urlparse(referer)
+    query_params = parse_qs(parsed_url.query)
+    
+    # 合并参数
+    params = {**default_params, **{k: v[0] for k, v in query_params.items() if k != 'page'}}
+    
+    # 构建URL
+    return url_for(target, **params)
+
+def barcode_taken(barcode, exclude_id=None):
+    """条码是否已被其他商品使用"""
+    if not barcode:
+        return False
+    query = Product.query.filter(Product.barcode == barcode)
+    if exclude_id is not None:
+        query = query.filter(Product.id != exclude_id)
+    return db.session.query(query.exists()).scalar()
+
+def sales_detail_filters(pid):
+    """销售详情页与其图表接口共用的筛选条件，返回 (条件列表, 开始日期, 结束日期)"""
+    start_date = end_date = None
+    try:
+        if request.args.get('start_date'):
+            start_date = dt.datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        if request.args.get('end_date'):
+            end_date = dt.datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+    except ValueError:
+        pass  # 日期无效时不限制范围
+    filters = [Sale.product_id == pid, Sale.type == 'out', Sale.is_reversed == False]
+    if start_date:
+        filters.append(Sale.created_at >= dt.datetime.combine(start_date, dt.time.min))
+    if end_date:
+        filters.append(Sale.created_at < dt.datetime.combine(end_date + timedelta(days=1), dt.time.min))
+    return filters, start_date, end_date
+
+def encode_sale_cursor(sale):
+    return f'{sale.created_at.isoformat()}_{sale.id}'
+
+def decode_sale_cursor(value):
+    """解析分页游标，无效时返回 None（回到第一页）"""
+    if not value:
+        return None
+    try:
+        ts, sale_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(ts), int(sale_id)
+    except ValueError:
+        return None
+
+def list_loader(*options):
+    """
+    列表页查询的加载选项：需要的关系一律在查询中预加载。
+    开启 RAISE_ON_LAZY_LOAD 时其余关系被访问会直接报错，便于发现逐行懒加载。
+    """
+    if current_app.config['RAISE_ON_LAZY_LOAD']:
+        options += (raiseload('*'),)
+    return options
+
+def csrf_period():
+    """
+    页面中 CSRF 令牌的时间段：304 复用的旧页面里的令牌须仍在有效期内，
+    因此每过半个有效期就换一次 ETag，让页面重新渲染。
+    """
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    return int(time.time() // (limit / 2)) if limit else 0
+
+def conditional(stamp):
+    """
+    列表页条件GET。stamp(*args) 返回廉价的版本戳（如目录版本号、最新销售ID），
+    与页面地址、当前用户、日期一起算出弱 ETag；与客户端 If-None-Match 一致时
+    直接返回 304，不再查询列表、渲染模板。有待显示的 flash 消息时总是重新渲染。
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+            key = (request.full_path, current_user.get_id(), current_user.is_admin,
+                   dt.date.today(), csrf_period(), stamp(*args, **kwargs))
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def last_sale_id(product_id=None):
+    query = db.session.query(func.max(Sale.id))
+    if product_id is not None:
+        query = query.filter(Sale.product_id == product_id)
+    return query.scalar()
+
+def stock_stamp(*args):
+    # 销售新增记录但不递增目录版本号，由最新销售ID体现；撤回不新增记录，会递增目录版本号
+    return last_sale_id(), catalog.version_stamp()
+
+def product_sales_stamp(pid):
+    return last_sale_id(pid), catalog.version_stamp()
+
+def logs_stamp():
+    # 先写入队列中尚未落库的日志
+    audit_queue.flush()
+    return db.session.query(func.max(Log.id)).scalar(), catalog.version_stamp()
+
+def log_action(user, action, sale=None):
+    """
+    记录操作日志。
+    关联销售记录的日志加入当前会话，随销售记录在同一事务中提交；
+    其余日志放入写入队列，由 audit 模块批量写入。
+    """
+    if sale is not None:
+        db.session.add(Log(user_id=user.id, action=action, sale=sale))
+    else:
+        audit_queue.enqueue(user.id, action)
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('404.html'), 404
+
+@bp.app_errorhandler(500)
+def internal_error(error):
+    return render_template('500.html'), 500
+
+def today_range():
+    today = datetime.now().date()
+    start = datetime(today.year, today.month, today.day, 0, 0, 0)
+    end = datetime(today.year, today.month, today.day, 23, 59, 59)
+    return start, end
+
+def check_admin():
+    if not (current_user.is_admin and current_user.is_active):
+        abort(403)
+
+def admin_required(view):
+    """管理员视图：放在 @heavy、@conditional 之前，非管理员不占用重型请求名额也不触发查询"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        check_admin()
+        return view(*args, **kwargs)
+    return wrapper
+
+@bp.app_context_processor
+def inject_background_config():
+    return {
+        'background_image_url': current_app.config['BACKGROUND_IMAGE_URL'],
+        'background_opacity': current_app.config['BACKGROUND_OPACITY'],
+        'background_size': current_app.config['BACKGROUND_SIZE'],
+        'announcement': current_app.config['DASHBOARD_ANNOUNCEMENT'],
+        'announcement_enabled': current_app.config['ANNOUNCEMENT_ENABLED'],
+        'analyzer_script': current_app.config['ANALYZE_SCRIPT'],
+        'analyze_enable': current_app.config['ANALYZE_ENABLE'],
+        'app_title': current_app.config['APP_TITLE']
+    }
+
+# 添加日期格式化过滤器
+@bp.app_template_filter('dateformat')
+def dateformat(value, format='%Y-%m-%d'):
+    if value is None:
+        return ""
+    return value.strftime(format)
+
+@bp.route('/')
+@login_required
+@statement_timeout('REPORT_STATEMENT_TIMEOUT_MS')
+@read_replica
+@conditional(stock_stamp)
+def dashboard():
+    # 获取日期范围参数，默认为今天
+    start_date_str = request.args.get('start_date', '')
+    end_date_str = request.args.get('end_date', '')
+    
+    today = dt.date.today()
+    
+    # 处理日期范围
+    if start_date_str and end_date_str:
+        try:
+            start_date = dt.datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            end_date = dt.datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            
+            # 确保结束日期不晚于今天
+            if end_date > today:
+                end_date = today
+            # 确保开始日期不晚于结束日期
+            if start_date > end_date:
+                start_date = end_date
+        except ValueError:
+            start_date = today
+            end_date = today
+    else:
+        # 如果没有提供日期范围，默认为今天
+        start_date = today
+        end_date = today
+    
+    # 获取日期范围
+    def get_date_range(start_date, end_date):
+        # 注意：结束日期要包含当天的23:59:59
+        start = dt.datetime.combine(start_date, dt.time.min)
+        end = dt.datetime.combine(end_date, dt.time.max)
+        return start, end
+    
+    # 获取选定日期范围
+    selected_start, selected_end = get_date_range(start_date, end_date)
+    
+    # 获取前一天的日期（用于前一天按钮，现在不需要了）
+    # prev_date = selected_date - dt.timedelta(days=1)
+    
+    # 获取今天的日期范围
+    today_start, today_end = get_date_range(today, today)
+    
+    # 获取昨天的日期范围
+    yesterday = today - dt.timedelta(days=1)
+    y_start, y_end = get_date_range(yesterday, yesterday)
+    
+    # 销售排行榜（选定日期范围）
+    sale_ranks = db.session.query(
+        Product.name,
+        func.sum(Sale.amount).label("total_amount"),
+        func.sum(Sale.quantity).label("total_qty")
+    ).join(Sale.product).filter(
+        Sale.type=='out', 
+        Sale.is_reversed == False,
+        Sale.created_at >= selected_start, 
+        Sale.created_at <= selected_end
+    ).group_by(Product.id).order_by(desc("total_amount")).limit(5).all()
+
+    # 分类销售额（选定日期范围）
+    cat_sales = db.session.query(
+        Category.name, func.sum(Sale.amount)
+    ).join(Product, Product.category_id == Category.id).join(Sale, Sale.product_id == Product.id)\
+     .filter(
+         Sale.type=='out',
+         Sale.is_reversed == False,
+         Sale.created_at >= selected_start,
+         Sale.created_at <= selected_end
+     ).group_by(Category.id).all()
+    
+    # 提取分类名称和销售额
+    cat_names = [c[0] for c in cat_sales]
+    cat_amounts = [float(c[1] or 0) for c in cat_sales]
+
+    # 今日销售额
+    today_total = db.session.query(func.sum(Sale.amount)).filter(
+        Sale.type=='out', 
+        Sale.is_reversed == False,
+        Sale.created_at >= today_start, 
+        Sale.created_at <= today_end
+    ).scalar() or 0
+    
+    # 昨日销售额
+    yesterday_total = db.session.query(func.sum(Sale.amount)).filter(
+        Sale.type=='out', 
+        Sale.is_reversed == False,
+        Sale.created_at >= y_start, 
+        Sale.created_at <= y_end
+    ).scalar() or 0
+    
+    # 选定日期范围的销售额
+    selected_date_total = db.session.query(func.sum(Sale.amount)).filter(
+        Sale.type=='out', 
+        Sale.is_reversed == False,
+        Sale.created_at >= selected_start, 
+        Sale.created_at <= selected_end
+    ).scalar() or 0
+    
+    # 历史总销售额
+    all_total = db.session.query(func.sum(Sale.amount)).filter(Sale.type=='out', Sale.is_reversed == False).scalar() or 0
+    
+    # 选定日期范围的销售流水：只取页面展示的列
+    sales = db.session.query(
+        Product.name.label('product_name'), Sale.quantity, Sale.amount, Sale.created_at
+    ).join(Sale.product).filter(
+        Sale.type=='out',
+        Sale.is_reversed == False,
+        Sale.created_at >= selected_start,
+        Sale.created_at <= selected_end
+    ).order_by(Sale.created_at.desc()).limit(20).all()
+    
+    return render_template('dashboard.html',
+                           sale_ranks=sale_ranks, 
+                           cat_names=cat_names, 
+                           cat_amounts=cat_amounts,
+                           today_total=today_total, 
+                           yesterday_total=yesterday_total,
+                           selected_date_total=selected_date_total,
+                           all_total=all_total,
+                           sales=sales,
+                           start_date=start_date,
+                           end_date=end_date,
+                           datetime=dt)
+
+@bp.route('/captcha')
+def captcha():
+    """生成验证码图片"""
+    from io import BytesIO
+    from PIL import Image, ImageDraw, ImageFont
+    import os
+    
+    captcha_text = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
+    session['captcha'] = captcha_text
+    
+    width, height = 180, 38
+    image = Image.new('RGB', (width, height), color=(255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    
+    try:
+        # 使用合适的字体大小
+        font = ImageFont.truetype("arial.ttf", 24)
+    except:
+        try:
+            font = ImageFont.truetype("/usr/share/fonts/truetype/Arial.ttf", 24) #自己找这个字体，我是去pip包的资源里扒的
+        except:
+            try:
+                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24)
+            except:
+                font = ImageFont.load_default()
+    
+    text_width = len(captcha_text) * 22
+    start_x = (width - text_width) // 2
+    
+    for i, char in enumerate(captcha_text):
+        y_position = (height - 24) // 2
+        draw.text((start_x + i * 26, y_position), char, fill=(0, 0, 0), font=font)
+    
+    # 添加少量干扰线
+    for i in range(5):
+        x1 = random.randint(0, width)
+        y1 = random.randint(0, height)
+        x2 = random.randint(0, width)
+        y2 = random.randint(0, height)
+        draw.line((x1, y1, x2, y2), fill=(180, 180, 180), width=1)
+    
+    # 添加少量噪点
+    for i in range(30):
+        x = random.randint(0, width)
+        y = random.randint(0, height)
+        draw.point((x, y), fill=(200, 200, 200))
+    
+    # 返回图片
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    buffer.seek(0)
+    
+    return send_file(buffer, mimetype='image/png')
+
+def is_login_locked(username):
+    """检查用户是否被锁定"""
+    if username in login_attempts:
+        attempts, lock_time = login_attempts[username]
+        if lock_time and datetime.now() < lock_time:
+            return True
+    return False
+
+def get_lock_time_remaining(username):
+    """获取剩余锁定时间（分钟）"""
+    if username in login_attempts:
+        attempts, lock_time = login_attempts[username]
+        if lock_time:
+            remaining = lock_time - datetime.now()
+            return max(0, int(remaining.total_seconds() / 60))
+    return 0
+
+def record_login_attempt(username, success):
+    """记录登录尝试"""
+    if username not in login_attempts:
+        login_attempts[username] = [0, None]
+    
+    if success:
+        # 登录成功，重置计数
+        login_attempts[username] = [0, None]
+    else:
+        # 登录失败
+        attempts, lock_time = login_attempts[username]
+        
+        # 如果还在锁定期内，直接返回
+        if lock_time and datetime.now() < lock_time:
+            return
+        
+        # 增加失败计数
+        attempts += 1
+        login_attempts[username][0] = attempts
+        
+        # 如果失败5次，锁定10分钟
+        if attempts >= 5:
+            lock_time = datetime.now() + timedelta(minutes=10)
+            login_attempts[username] = [attempts, lock_time]
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    form = LoginForm()
+    
+    # 检查是否被锁定
+    login_locked = False
+    lock_time_remaining = 0
+    
+    if form.username.data:
+        if is_login_locked(form.username.data):
+            login_locked = True
+            lock_time_remaining = get_lock_time_remaining(form.username.data)
+    
+    if form.validate_on_submit():
+        # 检查验证码
+        if 'captcha' not in session or session['captcha'].upper() != form.captcha.data.upper():
+            flash('验证码错误')
+            if form.username.data:
+                record_login_attempt(form.username.data, False)
+            return render_template('login.html', form=form, 
+                                 login_locked=login_locked, 
+                                 lock_time_remaining=lock_time_remaining)
+        
+        # 检查是否被锁定
+        if is_login_locked(form.username.data):
+            login_locked = True
+            lock_time_remaining = get_lock_time_remaining(form.username.data)
+            flash('登录失败次数过多，请稍后再试')
+            return render_template('login.html', form=form, 
+                                 login_locked=login_locked, 
+                                 lock_time_remaining=lock_time_remaining)
+        
+        user = User.query.filter_by(username=form.username.data).first()
+        if user and check_password_hash(user.password, form.password.data):
+            if not user.is_active:
+                flash('账户未激活，请联系管理员')
+                record_login_attempt(form.username.data, False)
+                return render_template('login.html', form=form)
+            
+            # 登录成功
+            login_user(user)
+            record_login_attempt(form.username.data, True)
+            # 清除验证码session
+            session.pop('captcha', None)
+            return redirect(url_for('main.dashboard'))
+        else:
+            # 登录失败
+            record_login_attempt(form.username.data, False)
+            flash('用户名或密码错误')
+            
+            # 重新检查是否被锁定
+            if form.username.data and is_login_locked(form.username.data):
+                login_locked = True
+                lock_time_remaining = get_lock_time_remaining(form.username.data)
+    
+    return render_template('login.html', form=form, 
+                         login_locked=login_locked, 
+                         lock_time_remaining=lock_time_remaining)
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    form = RegisterForm()
+    client_ip = request.remote_addr
+    
+    # 检查注册频率限制
+    if is_register_locked(client_ip):
+        flash('注册尝试过于频繁，请1小时后再试')
+        return render_template('register.html', form=form)
+    
+    if form.validate_on_submit():
+        # 检查验证码
+        if 'captcha' not in session or session['captcha'].upper() != form.captcha.data.upper():
+            flash('验证码错误')
+            record_register_attempt(client_ip)
+            return render_template('register.html', form=form)
+        
+        if User.query.filter_by(username=form.username.data).first():
+            flash('用户名已存在')
+            record_register_attempt(client_ip)
+        elif User.query.filter_by(email=form.email.data).first():
+            flash('邮箱已被注册')
+            record_register_attempt(client_ip)
+        else:
+            user = User(
+                username=form.username.data, 
+                password=generate_password_hash(form.password.data),
+                email=form.email.data  # 保存邮箱
+            )
+            db.session.add(user)
+            db.session.commit()
+            # 清除验证码session
+            session.pop('captcha', None)
+            flash('注册成功，请等待管理员审核')
+            return redirect(url_for('main.login'))
+    
+    return render_template('register.html', form=form)
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    return redirect(url_for('main.login'))
+
+@bp.route('/debug/email-test')
+def debug_email_test():
+    """邮件配置测试页面（仅在调试模式下可用）"""
+    if not current_app.debug:
+        abort(404)
+    
+    return render_template('email_test.html')
+
+@bp.route('/debug/send-test-email', methods=['POST'])
+def debug_send_test_email():
+    """发送测试邮件（仅在调试模式下可用）"""
+    if not current_app.debug:
+        abort(404)
+    
+    email = request.form.get('email')
+    if not email:
+        return jsonify({'success': False, 'message': '请输入邮箱地址'})
+    
+    # 创建一个虚拟用户用于测试
+    class TestUser:
+        def __init__(self, username, email):
+            self.username = username
+            self.email = email
+    
+    test_user = TestUser("测试用户", email)
+    
+    # 使用修改后的发送函数
+    success = send_reset_email(test_user)
+    
+    if success:
+        return jsonify({'success': True, 'message': '测试邮件发送成功！'})
+    else:
+        return jsonify({'success': False, 'message': '测试邮件发送失败，请查看控制台日志'})
+
+@bp.route('/products')
+@login_required
+@conditional(stock_stamp)
+def products():
+    page = request.args.get('page', 1, type=int)
+    keyword = request.args.get('keyword', '')
+    category_id = request.args.get('category_id', type=int)
+    query = Product.query.options(*list_loader(joinedload(Product.category)))
+    if keyword:
+        query = query.filter(get_backend().search_filter(Product.name, keyword))
+    if category_id:  # 如果有分类ID则过滤
+        query = query.filter_by(category_id=category_id)
+    products = query.order_by(Product.id.desc()).paginate(page=page, per_page=current_app.config['PER_PAGE'])
+
+    # 预加载分类数据用于下拉菜单
+    categories = category_cache.categories()
+
+    return render_template('products.html', products=products, categories=categories, keyword=keyword, category_id=category_id)
+
+@bp.route('/products/edit/<int:pid>', methods=['GET', 'POST'])
+@login_required
+def product_edit(pid):
+    check_admin()
+    prod = db.session.get(Product, pid)
+    if prod is None:
+        abort(404)
+    form = ProductForm(obj=prod)
+    categories = category_cache.categories()
+    form.category.choices = [(c.id, c.name) for c in categories]
+    if request.method == "GET":
+        form.category.data = prod.category_id
+    if form.validate_on_submit():
+        barcode = (form.barcode.data or '').strip() or None
+        if barcode_taken(barcode, exclude_id=prod.id):
+            flash(f'条码 {barcode} 已被其他商品使用', 'error')
+            return render_template('product_edit.html', form=form, product=prod)
+        prod.name = form.name.data
+        prod.barcode = barcode
+        prod.price = form.price.data
+        prod.stock = form.stock.data
+        prod.category_id = form.category.data
+        img_path = form.image_link.data.strip() if form.image_link.data else ''
+        img = form.image.data
+        if not img_path and img:
+            filename = secure_filename(img.filename)
+            filename = dt.datetime.now().strftime('%Y%m%d%H%M%S_') + filename
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            img.save(file_path)
+            img_path = 'uploads/' + filename
+        if img_path:
+            prod.image = img_path
+        db.session.commit()
+        log_action(current_user, f"编辑商品:{prod.name}")
+        flash('保存成功')
+        return redirect(url_for('main.products'))
+    return render_template('product_edit.html', form=form, product=prod)
+
+@bp.route('/products/delete/<int:pid>', methods=['POST'])
+@login_required
+def delete_product(pid):
+
+    from flask_wtf.csrf import validate_csrf
+    try:
+        validate_csrf(request.form.get('csrf_token')) 
+    except:
+        flash('CSRF令牌验证失败', 'error')
+        return redirect(url_for('main.products'))
+    
+    check_admin()
+    prod = db.session.get(Product, pid)
+    if prod is None:
+        abort(404)
+    db.session.delete(prod)
+    db.session.commit()
+    log_action(current_user, f"删除商品:{prod.name}")
+    flash('商品已删除')
+    return redirect(url_for('main.products'))
+
+@bp.route('/products/batch_delete', methods=['POST'])
+@login_required
+def batch_delete_products():
+    check_admin()
+    
+    # 使用 Flask-WTF 的 CSRF 验证
+    from flask_wtf.csrf import validate_csrf
+    try:
+        validate_csrf(request.form.get('csrf_token'))
+    except:
+        flash('CSRF令牌验证失败', 'error')
+        return redirect(url_for('main.products'))
+    
+    product_ids = request.form.get('product_ids', '')
+    if not product_ids:
+        flash('请选择要删除的商品', 'error')
+        return redirect(url_for('main.products'))
+    
+    try:
+        product_ids = [int(pid) for pid in product_ids.split(',')]
+        # 按集合删除商品及其销售记录，语句数与商品数量无关
+        deleted_names = delete_products(product_ids)
+        db.session.commit()
+        log_action(current_user, f"批量删除商品: {', '.join(deleted_names)}")
+        flash(f'成功删除 {len(deleted_names)} 个商品', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'删除商品时出错: {str(e)}', 'error')
+    
+    return redirect(url_for('main.products'))
+
+@bp.route('/products/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+@heavy(lambda: request.method == 'POST')
+def product_import():
+    csv_form = ProductImportForm()
+    manual_form = ManualProductForm()
+
+    # 预加载分类数据用于下拉菜单
+    categories = category_cache.categories()
+    manual_form.category.choices = [(c.id, c.name) for c in categories]
+
+    # 处理CSV导入
+    if csv_form.validate_on_submit() and csv_form.submit.data:
+        file = csv_form.file.data
+        try:
+            success = import_products_csv(file)
+            if success:
+                log_action(current_user, "批量导入商品")
+                flash('CSV导入成功', 'success')
+            else:
+                flash('CSV导入失败，请检查数据格式', 'error')
+        except Exception as e:
+            flash('CSV导入失败: ' + str(e), 'error')
+        return redirect(url_for('main.product_import'))
+
+    # 处理手动添加商品
+    if manual_form.validate_on_submit() and manual_form.submit.data:
+        barcode = (manual_form.barcode.data or '').strip() or None
+        if barcode_taken(barcode):
+            flash(f'条码 {barcode} 已被其他商品使用', 'error')
+            return render_template('product_import.html', csv_form=csv_form, manual_form=manual_form)
+        try:
+            # 创建新商品
+            product = Product(
+                name=manual_form.name.data,
+                barcode=barcode,
+                price=manual_form.price.data,
+                stock=manual_form.stock.data,
+                category_id=manual_form.category.data
+            )
+
+            # 处理图片
+            img_path = manual_form.image_link.data.strip() if manual_form.image_link.data else ''
+            img = manual_form.image.data
+            if not img_path and img:
+                filename = secure_filename(img.filename)
+                filename = dt.datetime.now().strftime('%Y%m%d%H%M%S_') + filename
+                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+                img.save(file_path)
+                img_path = 'uploads/' + filename
+
+            if img_path:
+                product.image = img_path
+
+            db.session.add(product)
+            db.session.commit()
+
+            log_action(current_user, f"手动添加商品: {product.name} (ID:{product.id})")
+            flash('商品添加成功', 'success')
+            return redirect(url_for('main.product_import'))
+
+        except Exception as e:
+            flash('商品添加失败: ' + str(e), 'error')
+
+    return render_template('product_import.html', csv_form=csv_form, manual_form=manual_form)
+
+@bp.route('/products/import/template')
+@login_required
+def download_import_template():
+    """下载CSV导入模板"""
+    check_admin()
+
+    # 创建CSV内容
+    output = StringIO()
+    writer = csv.writer(output)
+
+    # 写入表头
+    writer.writerow(['商品名', '单价', '库存', '分类', '图片链接(可选)', '条码(可选)'])
+
+    # 写入示例数据
+    writer.writerow(['示例商品1', '19.99', '100', '电子产品', 'http://example.com/image1.jpg', '6901234567892'])
+    writer.writerow(['示例商品2', '29.99', '50', '服装', '', 'SKU-0002'])
+    writer.writerow(['示例商品3', '9.99', '200', '食品', '', ''])
+
+    # 创建响应
+    response = make_response(output.getvalue())
+    response.headers["Content-Disposition"] = "attachment; filename=product_import_template.csv"
+    response.headers["Content-type"] = "text/csv"
+
+    return response
+
+@bp.route('/categories', methods=['GET', 'POST'])
+@login_required
+def categories():
+    check_admin()
+    form = CategoryForm()
+    if form.validate_on_submit():
+        if Category.query.filter_by(name=form.name.data).first():
+            flash('分类已存在')
+        else:
+            db.session.add(Category(name=form.name.data))
+            db.session.commit()
+            log_action(current_user, f"添加分类:{form.name.data}")
+            flash('添加成功')
+        return redirect(url_for('main.categories'))
+    cats = category_cache.categories()
+    return render_template('categories.html', form=form, categories=cats)
+
+@bp.route('/categories/delete/<int:cat_id>', methods=['POST'])
+@login_required
+def delete_category(cat_id):
+    # 添加CSRF验证
+    from flask_wtf.csrf import validate_csrf
+    try:
+        validate_csrf(request.form.get('csrf_token'))
+    except:
+        flash('CSRF令牌验证失败', 'error')
+        return redirect(url_for('main.categories'))
+
+    check_admin()
+    if db.session.get(Category, cat_id) is None:
+        abort(404)
+    
+    # 与批量删除共用分组计数检查，有商品的分类不会被删除
+    deleted_names, in_use = delete_categories([cat_id])
+    for name, product_count in in_use:
+        flash(f'该分类下有 {product_count} 个商品，无法删除', 'error')
+    
+    if deleted_names:
+        db.session.commit()
+        log_action(current_user, f"删除分类:{deleted_names[0]}")
+        flash('已删除', 'success')
+    return redirect(url_for('main.categories'))
+
+@bp.route('/categories/batch', methods=['POST'])
+@login_required
+def batch_categories():
+    """批量操作分类"""
+    check_admin()
+    
+    # CSRF验证
+    from flask_wtf.csrf import validate_csrf
+    try:
+        validate_csrf(request.form.get('csrf_token'))
+    except:
+        flash('CSRF令牌验证失败', 'error')
+        return redirect(url_for('main.categories'))
+    
+    action = request.form.get('action')
+    category_ids = request.form.getlist('category_ids')
+    
+    if not category_ids:
+        flash('请至少选择一个分类', 'error')
+        return redirect(url_for('main.categories'))
+    
+    try:
+        # 页面脚本把选中的分类以逗号拼接提交
+        category_ids = [int(cat_id) for value in category_ids for cat_id in value.split(',') if cat_id]
+        
+        if action == 'delete':
+            # 一次分组计数排除仍有商品的分类，其余一条语句删除
+            deleted_names, in_use = delete_categories(category_ids)
+            for name, product_count in in_use:
+                flash(f'分类 "{name}" 下有 {product_count} 个商品，无法删除', 'warning')
+            
+            if deleted_names:
+                db.session.commit()
+                log_action(current_user, f"批量删除分类: {', '.join(deleted_names)}")
+                flash(f'成功删除 {len(deleted_names)} 个分类', 'success')
+            else:
+                flash('没有分类被删除', 'info')
+                
+    except Exception as e:
+        db.session.rollback()
+        flash(f'操作失败: {str(e)}', 'error')
+    
+    return redirect(url_for('main.categories'))
+
+@bp.route('/categories/edit/<int:cat_id>', methods=['POST'])
+@login_required
+def edit_category(cat_id):
+    """编辑分类"""
+    check_admin()
+    
+    # CSRF验证
+    from flask_wtf.csrf import validate_csrf
+    try:
+        validate_csrf(request.form.get('csrf_token'))
+    except:
+        flash('CSRF令牌验证失败', 'error')
+        return redirect(url_for('main.categories'))
+    
+    category = db.session.get(Category, cat_id)
+    if not category:
+        flash('分类不存在', 'error')
+        return redirect(url_for('main.categories'))
+    
+    new_name = request.form.get('name', '').strip()
+    if not new_name:
+        flash('分类名不能为空', 'error')
+        return redirect(url_for('main.categories'))
+    
+    # 检查分类名是否已存在（排除自身）
+    existing_category = Category.query.filter(
+        Category.name == new_name, 
+        Category.id != cat_id
+    ).first()
+    
+    if existing_category:
+        flash('分类名已存在', 'error')
+        return redirect(url_for('main.categories'))
+    
+    try:
+        old_name = category.name
+        category.name = new_name
+        db.session.commit()
+        log_action(current_user, f"修改分类: {old_name} -> {new_name}")
+        flash('分类修改成功', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'修改失败: {str(e)}', 'error')
+    
+    return redirect(url_for('main.categories'))
+
+@bp.route('/sales')
+@login_required
+@conditional(stock_stamp)
+def sales():
+    page = request.args.get('page', 1, type=int)
+    keyword = request.args.get('keyword', '')  # 获取搜索关键词
+    category_id = request.args.get('category_id', type=int)  # 获取分类筛选
+    cats = category_cache.categories()
+    
+    # 查询并分页
+    query = Product.query.options(*list_loader(joinedload(Product.category))).order_by(Product.id.desc())
+    if keyword:
+        query = query.filter(get_backend().search_filter(Product.name, keyword))
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+
+    products = query.paginate(page=page, per_page=current_app.config['PER_PAGE'])
+    
+    # 按分类分组
+    from collections import defaultdict
+    grouped_products = defaultdict(list)
+    for product in products.items:
+        grouped_products[product.category.name].append(product)
+    
+    today_start, today_end = today_range()  # 先获取今天的日期范围
+    product_ids = [p.id for p in products.items]
+    
+    # 累计数据直接读 product_stats，今日数据对本页商品一次分组汇总
+    lifetime = {s.product_id: s for s in ProductStats.query.filter(ProductStats.product_id.in_(product_ids))}
+    today = {
+        row.product_id: row for row in db.session.query(
+            Sale.product_id,
+            func.sum(Sale.amount).label('amount'),
+            func.sum(Sale.quantity).label('qty'),
+        ).filter(
+            Sale.product_id.in_(product_ids), Sale.type == 'out',
+            Sale.created_at >= today_start,  # 使用预获取的范围
+            Sale.created_at <= today_end,
+            Sale.is_reversed == False
+        ).group_by(Sale.product_id)
+    }
+    
+    stat_map = {}
+    for pid in product_ids:
+        total = lifetime.get(pid)
+        today_row = today.get(pid)
+        stat_map[pid] = {
+            'all_sale': total.out_amount if total else 0,
+            'today_sale': today_row.amount if today_row else 0,
+            'all_qty': total.out_qty if total else 0,
+            'today_qty': today_row.qty if today_row else 0,
+        }
+    
+    return render_template('sales.html', 
+                           products=products, 
+                           grouped_products=grouped_products, 
+                           cats=cats, 
+                           stat_map=stat_map,
+                           keyword=keyword,
+                           category_id=category_id)
+
+@bp.route('/sales-simple')
+@login_required
+@conditional(stock_stamp)
+def sales_simple():
+    page = request.args.get('page', 1, type=int)
+    keyword = request.args.get('keyword', '')  # 获取搜索关键词
+    category_id = request.args.get('category_id', type=int)  # 获取分类筛选
+    cats = category_cache.categories()
+    
+    # 查询并分页
+    query = Product.query.options(*list_loader(joinedload(Product.category))).order_by(Product.id.desc())
+    if keyword:
+        query = query.filter(get_backend().search_filter(Product.name, keyword))
+    if category_id:
+        query = query.filter_by(category_id=category_id)
+
+    products = query.paginate(page=page, per_page=12)  # 每页显示12个商品
+    
+    return render_template('sales-simple.html', 
+                           products=products, 
+                           cats=cats, 
+                           keyword=keyword,
+                           category_id=category_id,
+                           rendered_at=datetime.now().timestamp())
+
+@bp.route('/sales/operate/<int:pid>', methods=['POST'])
+@login_required
+def sales_operate(pid):
+    # 重复提交的表单直接返回首次结果
+    key = idempotency.request_key(request.form)
+    replayed = idempotency.replay(key)
+    if replayed is not None:
+        return replayed
+    prod = db.session.get(Product, pid)
+    if prod is None:
+        abort(404)
+    try:
+        qty = int(request.form.get("quantity"))
+        # 负数进货/销售会反向改动库存和累计统计
+        if qty <= 0:
+            raise ValueError(qty)
+    except Exception:
+        flash("数量不合法")
+        # 根据来源页面决定重定向
+        if request.form.get("source_page") == "sales_simple" or 'sales-simple' in (request.referrer or ''):
+            return redirect(url_for('main.sales_simple'))
+        return redirect(url_for('main.sales'))
+    
+    # 获取来源页面信息，用于操作完成后重定向
+    source_page = request.form.get("source_page")
+    referer = request.referrer or ''
+    redirect_to_simple = source_page == "sales_simple" or 'sales-simple' in referer
+    if redirect_to_simple:
+        location = get_redirect_url('main.sales_simple', {'page': 1})
+    else:
+        location = get_redirect_url('main.sales', {'page': 1})
+    
+    if "submit_in" in request.form:
+        prod.stock += qty
+        sale = Sale(product_id=prod.id, quantity=qty, type='in', user_id=current_user.id, amount=0)
+        db.session.add(sale)
+        log_action(current_user, f"进货:{prod.name} 数量:{qty}", sale=sale)
+        return idempotency.commit(key, location, '进货成功')
+    elif "submit_out" in request.form:
+        if prod.stock < qty:
+            flash('库存不足')
+            return redirect(location)
+        prod.stock -= qty
+        amount = round(qty * prod.price, 2)
+        sale = Sale(product_id=prod.id, quantity=qty, type='out', user_id=current_user.id, amount=amount)
+        db.session.add(sale)
+        log_action(current_user, f"销售:{prod.name} 数量:{qty}", sale=sale)
+        return idempotency.commit(key, location, '销售成功')
+    else:
+        flash('未知操作')
+    
+    return redirect(location)
+
+# 销售详情每页条数
+DETAIL_PAGE_SIZE = 50
+
+@bp.route('/sales/detail/<int:pid>')
+@login_required
+@statement_timeout('REPORT_STATEMENT_TIMEOUT_MS')
+@read_replica
+@conditional(product_sales_stamp)
+def sales_detail(pid):
+    prod = db.session.get(Product, pid)
+    if prod is None:
+        abort(404)
+    
+    filters, start_date, end_date = sales_detail_filters(pid)
+    # 键集分页：按 (created_at, id) 倒序，游标为上一页最后一条，翻页不随页数变慢
+    cursor = decode_sale_cursor(request.args.get('before'))
+    if cursor:
+        filters.append(or_(
+            Sale.created_at < cursor[0],
+            and_(Sale.created_at == cursor[0], Sale.id < cursor[1]),
+        ))
+    sales = Sale.query.options(*list_loader(joinedload(Sale.user).load_only(User.username))).filter(*filters)\
+        .order_by(Sale.created_at.desc(), Sale.id.desc())\
+        .limit(DETAIL_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(sales) > DETAIL_PAGE_SIZE:
+        sales = sales[:DETAIL_PAGE_SIZE]
+        next_cursor = encode_sale_cursor(sales[-1])
+    stats = db.session.get(ProductStats, pid)
+    
+    return render_template('sales_detail.html', prod=prod, sales=sales, stats=stats,
+                           start_date=start_date, end_date=end_date,
+                           next_cursor=next_cursor, is_first_page=cursor is None)
+
+@bp.route('/api/sales/detail/<int:pid>/daily')
+@login_required
+@statement_timeout('REPORT_STATEMENT_TIMEOUT_MS')
+@read_replica
+@conditional(product_sales_stamp)
+def sales_detail_daily(pid):
+    """商品每日销量/销售额序列（一次分组查询），供销售详情页绘图"""
+    filters, start_date, end_date = sales_detail_filters(pid)
+    day = func.date(Sale.created_at)
+    rows = db.session.query(
+        day.label('day'),
+        func.sum(Sale.quantity).label('qty'),
+        func.sum(Sale.amount).label('amount'),
+    ).filter(*filters).group_by(day).order_by(day).all()
+    days = [str(row.day) for row in rows]
+    qty = [int(row.qty or 0) for row in rows]
+    amount = [round(float(row.amount or 0), 2) for row in rows]
+    return jsonify({
+        'success': True,
+        'days': days,
+        'qty': qty,
+        'amount': amount,
+        'total_qty': sum(qty),
+        'total_amount': round(sum(amount), 2),
+    })
+
+@bp.route('/sales/reverse/<int:sale_id>', methods=['POST'])
+@login_required
+def reverse_sale(sale_id):
+    """撤回进销存操作"""
+    key = idempotency.request_key(request.form)
+    replayed = idempotency.replay(key)
+    if replayed is not None:
+        return replayed
+    sale = Sale.query.get_or_404(sale_id)
+    product = sale.product
+    
+    # 检查操作权限（管理员或操作者本人）
+    if not (current_user.is_admin or current_user.id == sale.user_id):
+        flash('无权限执行此操作', 'danger')
+        return redirect(url_for('main.logs'))
+    
+    if sale.is_reversed:
+        flash('该操作已撤回', 'info')
+        return redirect(url_for('main.logs'))
+    
+    try:
+        # 根据操作类型反向操作
+        if sale.type == 'in':
+            # 撤回进货：减少库存
+            product.stock -= sale.quantity
+        elif sale.type == 'out':
+            # 撤回销售：增加库存
+            product.stock += sale.quantity
+        
+        # 标记为已撤回
+        sale.is_reversed = True
+        # 记录日志，与撤回在同一事务中提交
+        log_action(current_user, f"撤回了{sale.type}操作: {sale.product.name} x {sale.quantity}", sale=sale)
+        return idempotency.commit(key, url_for('main.logs'), '撤回成功', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'撤回失败: {str(e)}', 'danger')
+    
+    return redirect(url_for('main.logs'))
+
+
+# 离线同步每批最多处理的条数
+SYNC_BATCH_LIMIT = 500
+
+
+def catalog_item(product, stock=True):
+    """
+    商品目录中的一项（离线缓存用的精简字段）。
+    /api/catalog 不含库存：销售不递增目录版本号，增量中的库存会过时。
+    """
+    image = product.image
+    if image and not image.startswith('http'):
+        image = url_for('static', filename=image)
+    item = {
+        'id': product.id,
+        'name': product.name,
+        'barcode': product.barcode,
+        'price': float(product.price),
+        'category': product.category.name if product.category else None,
+        'image': image,
+    }
+    if stock:
+        item['stock'] = product.stock
+    return item
+
+
+def parse_client_ts(value):
+    """客户端记录时间（ISO 8601）转为服务器本地时间，无效或晚于当前时间时取当前时间"""
+    now = datetime.now()
+    try:
+        ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return now
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return min(ts, now)
+
+
+def apply_sync_line(line, products, applied, location):
+    """处理同步批次中的一条记录，返回该条结果"""
+    if not isinstance(line, dict) or not line.get('id'):
+        return {'id': None, 'status': 'error', 'message': '缺少记录id'}
+    key = str(line['id'])[:64]
+    if key in applied:
+        return {'id': key, 'status': 'duplicate'}
+    # 离线队列按用户保存；其他用户的记录不能以当前用户的身份写入
+    if line.get('user_id') is not None and str(line['user_id']) != str(current_user.id):
+        return {'id': key, 'status': 'wrong_user', 'message': '该记录属于其他用户，请由该用户登录后同步'}
+    try:
+        prod = products.get(int(line.get('product_id')))
+        qty = int(line.get('quantity'))
+    except (TypeError, ValueError):
+        return {'id': key, 'status': 'error', 'message': '商品或数量不合法'}
+    if prod is None:
+        return {'id': key, 'status': 'error', 'message': '商品不存在'}
+    if qty <= 0:
+        return {'id': key, 'status': 'error', 'message': '数量不合法'}
+
+    if line.get('type') == 'in':
+        prod.stock += qty
+        amount = 0
+        label = '进货'
+    elif line.get('type') == 'out':
+        if prod.stock < qty:
+            return {'id': key, 'status': 'error', 'message': f'{prod.name} 库存不足'}
+        prod.stock -= qty
+        amount = round(qty * prod.price, 2)
+        label = '销售'
+    else:
+        return {'id': key, 'status': 'error', 'message': '未知操作'}
+
+    sale = Sale(product_id=prod.id, quantity=qty, type=line['type'], user_id=current_user.id,
+                amount=amount, created_at=parse_client_ts(line.get('ts')))
+    db.session.add(sale)
+    log_action(current_user, f"{label}:{prod.name} 数量:{qty}", sale=sale)
+    idempotency.remember(key, location, f'{label}成功')
+    applied.add(key)
+    return {'id': key, 'status': 'ok'}
+
+
+@bp.route('/api/sales/sync', methods=['POST'])
+@login_required
+def api_sales_sync():
+    """
+    批量同步简易销售页离线记录的进货/销售。
+    请求体: {"sales": [{"id": 幂等令牌, "product_id": 1, "type": "in"|"out", "quantity": 2, "ts": 客户端时间}]}
+    整批在一个事务中处理，返回逐条结果及涉及商品的最新库存。
+    """
+    data = request.get_json(silent=True) or {}
+    lines = data.get('sales')
+    if not isinstance(lines, list) or len(lines) > SYNC_BATCH_LIMIT:
+        return jsonify({'success': False, 'message': f'sales 必须是不超过{SYNC_BATCH_LIMIT}条的列表'}), 400
+
+    keys = [str(line['id'])[:64] for line in lines if isinstance(line, dict) and line.get('id')]
+    applied = idempotency.applied_keys(keys)
+    product_ids = set()
+    for line in lines:
+        try:
+            product_ids.add(int(line.get('product_id')))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+
+    location = url_for('main.sales_simple')
+    results = [apply_sync_line(line, products, applied, location) for line in lines]
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 同一批记录被并发提交，客户端稍后重试时会得到 duplicate
+        db.session.rollback()
+        return jsonify({'success': False, 'message': '记录正在同步中，请稍后重试'}), 409
+
+    return jsonify({
+        'success': True,
+        'results': results,
+        'stock': {p.id: p.stock for p in products.values()},
+        'server_time': datetime.now().timestamp(),
+        'csrf_token': generate_csrf(),
+    })
+
+
+@bp.route('/api/catalog')
+@login_required
+def api_catalog():
+    """
+    商品目录。不带参数时返回全量快照（Service Worker 缓存供简易销售页离线使用）；
+    带 since=<版本号> 时只返回该版本之后变更和删除的商品。
+    以目录版本号作为 ETag，目录未变化时返回 304。
+    """
+    since = request.args.get('since', type=int)
+    version = catalog.current_version()
+    # 分类增删不改目录版本号，但会改变返回的分类列表
+    etag = f'catalog-{version}-{catalog.current_version(catalog.CATEGORY_ROW)}'
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    # 客户端版本比服务器新（如数据库已重建）时改为全量
+    full = since is None or since > version
+    if full:
+        products = Product.query.options(joinedload(Product.category)).order_by(Product.id.desc()).all()
+        deleted = []
+    else:
+        products, deleted = catalog.changes_since(since)
+    response = jsonify({
+        'success': True,
+        'version': version,
+        'full': full,
+        'products': [catalog_item(p, stock=False) for p in products],
+        'deleted': deleted,
+        'categories': [{'id': c.id, 'name': c.name} for c in category_cache.categories()],
+        'csrf_token': generate_csrf(),
+    })
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@bp.route('/api/pool-stats')
+@login_required
+def api_pool_stats():
+    """本进程数据库连接池的使用情况与取连接耗时（每个 worker 各自统计）"""
+    check_admin()
+    return jsonify({'success': True, 'pid': os.getpid(), 'pools': engine_metrics(db.engines)})
+
+
+@bp.route('/api/products/by-code/<path:code>')
+@login_required
+def api_product_by_code(code):
+    """扫码查询：按条码/SKU 返回商品"""
+    product = catalog.find_by_code(code.strip())
+    if product is None:
+        return jsonify({'success': False, 'message': f'未找到条码 {code}'}), 404
+    return jsonify({'success': True, 'product': catalog_item(product)})
+
+
+@bp.route('/sw.js')
+def service_worker():
+    """Service Worker 必须从根路径提供，才能接管 /sales-simple 页面"""
+    response = send_from_directory(current_app.static_folder, 'sw.js', mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@bp.route('/export')
+@login_required
+@heavy()
+@read_replica
+def export():
+    sales = db.session.query(
+        Product.name.label('product_name'), Sale.quantity, Sale.type, Sale.amount,
+        User.username, Sale.created_at
+    ).outerjoin(Sale.product).outerjoin(Sale.user).filter(Sale.is_reversed == False).order_by(Sale.id)
+    # openpyxl 只在导出时用到，按需加载
+    import openpyxl
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['商品', '数量', '类型', '金额', '操作人', '时间'])
+    for s in sales:
+        ws.append([s.product_name, s.quantity, '进货' if s.type == 'in' else '销售', s.amount, s.username, s.created_at.strftime('%Y-%m-%d %H:%M')])
+    bio = BytesIO()
+    wb.save(bio)
+    bio.seek(0)
+    return send_file(bio, as_attachment=True, download_name='sales.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+@bp.route('/users')
+@login_required
+def users():
+    check_admin()
+    users = User.query.all()
+    return render_template('users.html', users=users)
+
+@bp.route('/users/approve/<int:uid>', methods=['GET', 'POST'])
+@login_required
+def user_approve(uid):
+    check_admin()
+    user = db.session.get(User, uid)
+    if user is None:
+        abort(404)
+    form = UserApproveForm(obj=user)
+    
+    if form.validate_on_submit():
+        # 初始化修改标记
+        changes_made = False
+        message_parts = []
+        # 日志在提交成功后再写入，避免中途校验失败时记录了未生效的修改
+        actions = []
+
+        # 处理用户名修改
+        new_username = form.username.data.strip()
+        if new_username != user.username:
+            existing_user = User.query.filter(User.username == new_username, User.id != user.id).first()
+            if existing_user:
+                flash('用户名已存在，请选择其他用户名', 'error')
+                return render_template('user_approve.html', form=form, user=user)
+            
+            old_username = user.username
+            user.username = new_username
+            actions.append(f"修改用户 {old_username} 的用户名为 {new_username}")
+            changes_made = True
+            message_parts.append("用户名")
+
+        new_email = form.email.data.strip() if form.email.data else None
+        if new_email != user.email:
+            if new_email:  # 如果提供了新邮箱
+                existing_user = User.query.filter(User.email == new_email, User.id != user.id).first()
+                if existing_user:
+                    flash('邮箱已被其他用户使用', 'error')
+                    return render_template('user_approve.html', form=form, user=user)
+            
+            old_email = user.email
+            user.email = new_email
+            actions.append(f"修改用户 {user.username} 的邮箱")
+            changes_made = True
+            message_parts.append("邮箱")
+
+        # 处理密码修改 - 只在提供了旧密码和新密码时才验证和更新
+        if form.old_password.data or form.new_password.data:
+            # 如果提供了旧密码但新密码为空
+            if form.old_password.data and not form.new_password.data:
+                flash('如果修改密码，必须填写新密码', 'error')
+                return render_template('user_approve.html', form=form, user=user)
+            
+            # 如果提供了新密码但旧密码为空
+            if form.new_password.data and not form.old_password.data:
+                flash('要修改密码，必须提供当前密码', 'error')
+                return render_template('user_approve.html', form=form, user=user)
+            
+            # 只有当两个字段都提供时才进行验证
+            if form.old_password.data and form.new_password.data:
+                if not check_password_hash(user.password, form.old_password.data):
+                    flash('当前密码错误', 'error')
+                    return render_template('user_approve.html', form=form, user=user)
+                
+                if len(form.new_password.data) < 6:
+                    flash('新密码长度至少为6位', 'error')
+                    return render_template('user_approve.html', form=form, user=user)
+                
+                user.password = generate_password_hash(form.new_password.data)
+                changes_made = True
+                message_parts.append("密码")
+        
+        # 处理状态修改
+        if user.is_active != form.is_active.data:
+            changes_made = True
+            message_parts.append("激活状态")
+        if user.is_admin != form.is_admin.data:
+            changes_made = True
+            message_parts.append("管理员权限")
+        
+        # 应用所有修改
+        user.is_active = form.is_active.data
+        user.is_admin = form.is_admin.data
+        
+        # 如果有修改才提交并显示消息
+        if changes_made:
+            db.session.commit()  # 统一提交一次
+            for action in actions:
+                log_action(current_user, action)
+            message = "已更新" + "、".join(message_parts)
+            flash(f'{message} 信息已保存', 'success')
+        else:
+            flash('没有检测到任何修改', 'info')
+        
+        return redirect(url_for('main.users'))
+    
+    return render_template('user_approve.html', form=form, user=user)
+
+@bp.route('/users/delete/<int:uid>', methods=['POST'])
+@login_required
+def delete_user(uid):
+    check_admin()
+    
+    # 不能删除自己
+    if uid == current_user.id:
+        flash('不能删除自己的账户', 'error')
+        return redirect(url_for('main.users'))
+    
+    user = db.session.get(User, uid)
+    if user is None:
+        flash('用户不存在', 'error')
+        return redirect(url_for('main.users'))
+    
+    # 检查是否至少保留一个管理员账户
+    if user.is_admin:
+        admin_count = User.query.filter_by(is_admin=True).count()
+        if admin_count <= 1:
+            flash('必须至少保留一个管理员账户', 'error')
+            return redirect(url_for('main.users'))
+    
+    # 记录删除操作
+    username = user.username
+    
+    # 删除用户相关的日志记录（可选，根据需求决定）
+    # Log.query.filter_by(user_id=uid).delete()
+    
+    # 删除用户相关的销售记录（可选，根据需求决定）
+    # Sale.query.filter_by(user_id=uid).delete()
+    
+    # 删除用户
+    db.session.delete(user)
+    db.session.commit()
+    
+    log_action(current_user, f"删除用户: {username}")
+    flash(f'用户 {username} 已删除', 'success')
+    return redirect(url_for('main.users'))
+
+# 日志超过此页数按重型请求处理（OFFSET 越大扫描越多）
+LOGS_HEAVY_PAGE = 50
+
+@bp.route('/logs')
+@login_required
+@admin_required
+@heavy(lambda: request.args.get('page', 1, type=int) > LOGS_HEAVY_PAGE)
+@statement_timeout('REPORT_STATEMENT_TIMEOUT_MS')
+@read_replica
+@conditional(logs_stamp)
+def logs():
+    page = request.args.get('page', 1, type=int)
+    #logs = Log.query.order_by(Log.ts.desc()).paginate(page=page, per_page=20)
+
+    logs = Log.query.options(*list_loader(
+                       joinedload(Log.user).load_only(User.username),
+                       joinedload(Log.sale).load_only(Sale.quantity, Sale.type, Sale.is_reversed)
+                                           .joinedload(Sale.product).load_only(Product.name),
+                   ))\
+                   .order_by(Log.ts.desc())\
+                   .paginate(page=page, per_page=20)
+
+    return render_template('logs.html', logs=logs)
+
+def migrate_log_sale_relations():
+    """将历史销售记录与日志关联"""
+    logs = Log.query.filter(Log.action.like('%销售:%') | Log.action.like('%进货:%')).all()
+    for log in logs:
+        # 从日志信息中提取销售ID（需要根据实际日志格式调整）
+        # 此处仅为示例，实际实现需根据日志格式定制
+        if 'ID:' in log.action:
+            sale_id = int(log.action.split('ID:')[1].split()[0])
+            log.sale_id = sale_id
+    db.session.commit()